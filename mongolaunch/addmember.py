@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+'''Add a member to a replica set of a launched topology, starting it with a
+copy of another member's data instead of an initial sync.
+
+'''
+
+import re
+import sys
+
+import mongolaunch.cli
+from mongolaunch import errors
+import mongolaunch.models
+from mongolaunch.topology import attach, load_manifest
+
+
+def main():
+    mongolaunch.cli.main(["add-member"] + sys.argv[1:])
+
+
+def run(args):
+    '''Run the add-member command with arguments parsed by mongolaunch.cli'''
+    topology = attach(load_manifest(args.manifest), args.access, args.secret)
+    mongo = add_member(topology, args.set, args.host, args.port,
+                       mongoid=args.id, source=args.source,
+                       dbpath=args.dbpath, logpath=args.logpath)
+    output = args.output or args.manifest
+    topology.save(output)
+    print("Added %s to replica set %s at %s:%d" % (
+        mongo.config['_id'], args.set, mongo.host.hostname(), mongo.port))
+    print("Wrote manifest to %s" % output)
+
+
+def member_config(source, mongoid, port, dbpath=None, logpath=None):
+    '''Return the configuration of a new member like <source>, another
+    member of the set, listening on <port>
+
+    '''
+    options = re.sub(r"--port\s+\d+", "--port %d" % port,
+                     source.config.get('options', ""))
+    return {
+        "_id": mongoid,
+        "bin": "mongod",
+        "version": source.config['version'],
+        "options": options,
+        "dbpath": dbpath or "/data/db-%d" % port,
+        "logpath": logpath or "/var/log/mongod-%d.log" % port
+    }
+
+
+def add_member(topology, rsid, host_id, port, mongoid=None, source=None,
+               dbpath=None, logpath=None):
+    '''Start a mongod on port <port> of the host <host_id> of <topology>,
+    seeded with the data of the member <source> (the primary if not
+    given), and add it to the replica set <rsid> (see
+    ReplicaSet.add_member). The configuration of <topology> is updated to
+    match. Returns the new Mongod.
+
+    '''
+    if rsid not in topology.replicas:
+        raise errors.MLConfigurationError("no replica set %s in %s" % (
+            rsid, topology.title))
+    hosts = topology.hosts
+    if host_id not in hosts:
+        raise errors.MLConfigurationError("no host %s in %s" % (
+            host_id, topology.title))
+    rs = topology.replicas[rsid]
+    members = dict((m.config['_id'], m) for m in rs.members)
+    if source is not None and source not in members:
+        raise errors.MLConfigurationError(
+            "%s is not a member of replica set %s" % (source, rsid))
+    mongoid = mongoid or "%s_%d" % (rsid, len(rs.members))
+    if mongoid in topology.processes():
+        raise errors.MLConfigurationError(
+            "there is a mongo process named %s already" % mongoid)
+    host = hosts[host_id]
+    if any(m.port == port for m in host.mongoes):
+        raise errors.MLConfigurationError(
+            "port %d is taken on host %s" % (port, host_id))
+
+    template = members.get(source) or rs.members[0]
+    config = member_config(template, mongoid, port, dbpath, logpath)
+    mongo = mongolaunch.models.Mongod(config=config, port=port)
+    host.add_mongo(mongo)
+    rs.add_member(mongo, source=members.get(source))
+    topology.mongoes[mongoid] = mongo
+
+    # Launching the configuration again should bring the member back
+    if topology.config is not None:
+        entry = dict(config, port=port)
+        if isinstance(host, mongolaunch.models.Instance):
+            entry['instance'] = host_id
+        else:
+            entry['host'] = host_id
+        topology.config['mongo'].append(entry)
+        for rs_config in topology.config.get('replicas', []):
+            if rs_config['_id'] == rsid:
+                rs_config['members'].append(mongoid)
+    return mongo
+
+
+if __name__ == '__main__':
+    main()
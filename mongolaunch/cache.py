@@ -0,0 +1,128 @@
+'''On-disk cache of EC2 metadata that rarely changes.
+
+Whether an AMI is Windows, which key pairs and security groups exist, and
+which availability zones there are is remembered per region in a JSON file
+under settings.CACHE_PATH. Entries expire after settings.CACHE_TTL seconds,
+so launching a configuration that was launched recently doesn't need any
+EC2 requests before run_instances.
+
+'''
+
+import json
+import os
+import os.path
+import tempfile
+import threading
+import time
+
+from mongolaunch import settings
+
+
+class MetadataCache(object):
+    '''EC2 metadata for the region of an EC2Connection
+
+    conn            the EC2Connection used on cache misses
+    path            directory holding cache files
+    ttl             seconds an entry stays valid
+    refresh         ignore what's on disk and look everything up again
+
+    '''
+
+    def __init__(self, conn, path=None, ttl=None, refresh=False):
+        self._conn = conn
+        self._ttl = settings.CACHE_TTL if ttl is None else ttl
+        self._path = os.path.join(path or settings.CACHE_PATH,
+                                  "%s.json" % conn.region.name)
+        self._lock = threading.Lock()
+        self._data = {"images": {}, "key_pairs": {}, "security_groups": {},
+                      "zones": {}}
+        if not refresh:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self._path, "r") as fd:
+                data = json.load(fd)
+        except (IOError, ValueError):
+            # Missing or corrupt cache files are just empty caches
+            return
+        for section in self._data:
+            self._data[section].update(data.get(section, {}))
+
+    def _save(self):
+        directory = os.path.dirname(self._path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # Write a new file and rename it, so concurrent readers never see a
+        # partial file
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, "w") as temp:
+            json.dump(self._data, temp, indent=4, sort_keys=True)
+        os.rename(temp_path, self._path)
+
+    def _get(self, section, key, lookup):
+        '''Return the cached value for <key> in <section>, calling
+        lookup(key) to find it if it is missing or expired. lookup may return
+        None for values that shouldn't be cached.
+
+        '''
+        with self._lock:
+            entry = self._data[section].get(key)
+            if entry is not None and time.time() - entry['ts'] < self._ttl:
+                return entry['value']
+            value = lookup(key)
+            if value is not None:
+                self._data[section][key] = {"value": value, "ts": time.time()}
+                self._save()
+            return value
+
+    def remember(self, section, key, value=True):
+        '''Record <value> for <key> in <section> without asking EC2'''
+        with self._lock:
+            self._data[section][key] = {"value": value, "ts": time.time()}
+            self._save()
+
+    def image_is_windows(self, ami):
+        '''Return True if <ami> is a Windows image'''
+        return self._get("images", ami, lambda ami: (
+            self._conn.get_image(ami).platform == 'windows'))
+
+    def _exists(self, section, name, describe, not_found):
+        '''Return True if describe(name) finds <name>, and False if it
+        fails with the EC2 error code <not_found>. Other errors are raised.
+
+        '''
+        # boto is only imported by the commands that talk to EC2
+        from boto.exception import EC2ResponseError
+
+        def lookup(name):
+            try:
+                describe(name)
+                return True
+            except EC2ResponseError as e:
+                if e.error_code != not_found:
+                    raise
+                # Don't cache, since it's about to be created
+                return None
+        return bool(self._get(section, name, lookup))
+
+    def key_pair_exists(self, name):
+        '''Return True if the key pair <name> exists'''
+        return self._exists(
+            "key_pairs", name,
+            lambda name: self._conn.get_all_key_pairs(keynames=[name]),
+            "InvalidKeyPair.NotFound")
+
+    def security_group_exists(self, name):
+        '''Return True if the security group <name> exists'''
+        return self._exists(
+            "security_groups", name,
+            lambda name: self._conn.get_all_security_groups(
+                groupnames=[name]),
+            "InvalidGroup.NotFound")
+
+    def available_zones(self):
+        '''Return the names of the availability zones in the region'''
+        return self._get("zones", "available", lambda _: sorted(
+            z.name for z in self._conn.get_all_zones()
+            if z.state == 'available'))
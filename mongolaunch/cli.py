@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+'''The mongolaunch command and its subcommands.
+
+Only argparse and mongolaunch.settings are imported here. The module that
+runs a subcommand, along with boto, pymongo and fabric, is imported once
+that subcommand is chosen, so that --help and quick commands don't pay for
+backends they don't use.
+
+'''
+
+import argparse
+import importlib
+import sys
+
+from mongolaunch import errors
+from mongolaunch.settings import (
+    ADDRESSING_POLICIES,
+    JOURNAL_PATH,
+    MONITOR_INTERVAL
+)
+
+# Subcommand -> module with a run(args) function
+COMMANDS = {
+    "launch": "mongolaunch.launch",
+    "terminate": "mongolaunch.terminate",
+    "snapshot": "mongolaunch.snapshot",
+    "profile": "mongolaunch.profiler",
+    "failover-bench": "mongolaunch.failover",
+    "switch-version": "mongolaunch.switch",
+    "add-member": "mongolaunch.addmember"
+}
+
+
+def _aws_arguments(parser):
+    parser.add_argument("--secret-key", type=str, dest="secret", help=
+                        "AWS secret key. This can be omitted if AWS_SECRET_KEY "
+                        "is defined in your environment", default=None)
+    parser.add_argument("--access-key", type=str, dest="access", help=
+                        "AWS access key. This can be omitted if AWS_ACCESS_KEY "
+                        "is defined in your environment", default=None)
+
+
+def _launch_arguments(parser):
+    parser.add_argument("--key-name", type=str, dest="key_name", default=None,
+                        help="key pair name")
+    parser.add_argument("--config", type=str, dest="config_filename",
+                        default="config.json", help="JSON configuration file")
+    parser.add_argument("--start-port", type=int, dest="port", default=27017,
+                        help="starting port for mongo processes")
+    parser.add_argument("--security-group", type=str, dest="sec_group", help=
+                        "security group name", default="mongolaunch")
+    parser.add_argument("--region", type=str, dest="region", help="AWS region",
+                        default="us-west-1")
+    parser.add_argument("-z", "--availability-zone", dest='zone',
+                        action='store', default=None, help="availability zone")
+    parser.add_argument("--instance-type", type=str, dest="instance_type",
+                        default="t1.micro", help="EC2 instance type. Defaults "
+                        "to t1.micro")
+    parser.add_argument("-t", "--tag", type=str, dest="tags", action="append",
+                        help="Add a tag with --tag key=value or --tag tagname",
+                        default=[])
+    _aws_arguments(parser)
+    parser.add_argument("--seed-workers", type=int, dest="seed_workers",
+                        default=None, help="number of processes to use when "
+                        "loading the \"seed\" section of the config file. "
+                        "Defaults to the number of CPUs")
+    parser.add_argument("--monitor", action="store_true", dest="monitor",
+                        default=False, help="collect metrics from all mongo "
+                        "processes after setup, until interrupted")
+    parser.add_argument("--monitor-interval", type=float,
+                        dest="monitor_interval",
+                        default=MONITOR_INTERVAL, help="seconds between "
+                        "metrics collections in --monitor mode")
+    parser.add_argument("--monitor-jsonl", type=str, dest="monitor_jsonl",
+                        default=None, help="append metrics to this JSON "
+                        "Lines file in --monitor mode")
+    parser.add_argument("--monitor-port", type=int, dest="monitor_port",
+                        default=None, help="serve metrics in the Prometheus "
+                        "text format on this local port in --monitor mode")
+
+    parser.add_argument("--manifest", type=str, dest="manifest",
+                        default=None, help="write a JSON description of "
+                        "the launched topology to this file")
+    parser.add_argument("--refresh-cache", action="store_true",
+                        dest="refresh_cache", default=False,
+                        help="look up AMIs, key pairs and security groups "
+                        "again instead of using cached results")
+    parser.add_argument("--callback-url", type=str, dest="callback_url",
+                        default=None, help="URL where hosts can reach this "
+                        "machine to report setup progress, e.g. "
+                        "http://203.0.113.7:8111. mongolaunch listens on "
+                        "its port. Recommended for EC2, so that processes "
+                        "that fail to start are reported right away: if not "
+                        "given, failures on Linux instances are read from "
+                        "their console output, which EC2 only updates every "
+                        "few minutes, and failures on Windows instances "
+                        "aren't reported.")
+    parser.add_argument("--from-snapshot", type=str, dest="snapshot",
+                        default=None, help="launch the configuration "
+                        "captured by mongolaunch snapshot in this file, with "
+                        "its data. Replaces --config.")
+    parser.add_argument("--journal", type=str, dest="journal",
+                        default=JOURNAL_PATH, help="file to record the "
+                        "steps of the launch in. Defaults to %s"
+                        % JOURNAL_PATH)
+    parser.add_argument("--resume", action="store_true", dest="resume",
+                        default=False, help="finish the launches in the "
+                        "journal that were interrupted, instead of "
+                        "launching --config")
+    parser.add_argument("--abandon", action="store_true", dest="abandon",
+                        default=False, help="mark the launches in the "
+                        "journal that were interrupted as abandoned, so "
+                        "that --resume leaves them alone, and exit. Their "
+                        "instances keep running until mongolaunch "
+                        "terminate.")
+    parser.add_argument("--copies", type=int, dest="copies", default=1,
+                        help="launch this many identical copies of the "
+                        "configuration at once")
+    parser.add_argument("--addressing", type=str, dest="addressing",
+                        default="auto", choices=ADDRESSING_POLICIES,
+                        help="how mongo processes reach each other: by "
+                        "public hostname, by private address, or \"auto\" "
+                        "to use private addresses when all instances are in "
+                        "the same VPC (or region, outside of a VPC). "
+                        "Defaults to auto.")
+    parser.add_argument("-n", "--dry-run", action="store_true",
+                        dest="dry_run", default=False, help="check the "
+                        "configuration and print what would be launched, "
+                        "without contacting EC2 or any host")
+
+
+def _terminate_arguments(parser):
+    parser.add_argument("--region", type=str, dest="region", help="AWS region "
+                        "of instances the journal has no region for",
+                        default="us-west-1")
+    parser.add_argument("--journal", type=str, dest="journal",
+                        default=JOURNAL_PATH, help="journal written by "
+                        "mongolaunch. Defaults to %s" % JOURNAL_PATH)
+    _aws_arguments(parser)
+
+
+def _snapshot_arguments(parser):
+    parser.add_argument("--manifest", type=str, dest="manifest",
+                        required=True, help="manifest written by "
+                        "mongolaunch launch --manifest")
+    parser.add_argument("--name", type=str, dest="name", required=True,
+                        help="name of the snapshot")
+    parser.add_argument("--output", type=str, dest="output", default=None,
+                        help="file to describe the snapshot in. Defaults "
+                        "to <name>.json. Pass it to mongolaunch launch "
+                        "--from-snapshot to launch the topology again.")
+    _aws_arguments(parser)
+
+
+def _profile_arguments(parser):
+    parser.add_argument("--manifest", type=str, dest="manifest",
+                        required=True, help="manifest written by "
+                        "mongolaunch launch --manifest")
+    parser.add_argument("--db", type=str, dest="databases", action="append",
+                        default=[], help="database to profile. May be given "
+                        "more than once. Defaults to every database that "
+                        "exists on each member when the command runs; "
+                        "databases created later are not profiled, so name "
+                        "them with --db before your benchmark creates them.")
+    actions = parser.add_subparsers(dest="action")
+
+    enable = actions.add_parser("enable", help="turn on the profiler")
+    enable.add_argument("--level", type=int, dest="level", default=1,
+                        choices=(1, 2), help="1 for slow operations only, "
+                        "2 for all operations")
+    enable.add_argument("--slowms", type=int, dest="slowms", default=100,
+                        help="operations slower than this are slow")
+    actions.add_parser("disable", help="turn off the profiler")
+    harvest = actions.add_parser(
+        "harvest", help="collect profiled operations into a report")
+    harvest.add_argument("--output", type=str, dest="output",
+                         default="profile-report.json",
+                         help="file to write the report to")
+    harvest.add_argument("--state", type=str, dest="state", default=None,
+                         help="file remembering what was harvested, so the "
+                         "next harvest only reads newer operations. "
+                         "Defaults to <output>.state")
+    harvest.add_argument("--top", type=int, dest="top", default=20,
+                         help="number of query shapes to print")
+
+
+def _failover_arguments(parser):
+    parser.add_argument("--manifest", type=str, dest="manifests",
+                        action="append", required=True, help="manifest "
+                        "written by mongolaunch launch --manifest. May be "
+                        "given more than once to compare topologies.")
+    parser.add_argument("--set", type=str, dest="sets", action="append",
+                        default=[], help="_id of a replica set to fail "
+                        "over. May be given more than once. Defaults to "
+                        "every replica set.")
+    parser.add_argument("--mode", type=str, dest="mode", default="stepdown",
+                        choices=("stepdown", "kill"), help="step the "
+                        "primary down, or kill it with SIGKILL and restart "
+                        "it. Defaults to stepdown.")
+    parser.add_argument("--trials", type=int, dest="trials", default=10,
+                        help="number of failovers per replica set")
+    parser.add_argument("--interval", type=float, dest="interval",
+                        default=10, help="seconds between two failovers, "
+                        "once the set has recovered")
+    parser.add_argument("--write-interval", type=float,
+                        dest="write_interval", default=0.01,
+                        help="seconds between two inserts of the writer")
+    parser.add_argument("--timeout", type=float, dest="timeout", default=60,
+                        help="seconds to wait for a new primary, and for "
+                        "the set to recover")
+    parser.add_argument("--output", type=str, dest="output",
+                        default="failover-report.json",
+                        help="file to write the report to")
+    _aws_arguments(parser)
+
+
+def _switch_arguments(parser):
+    parser.add_argument("--manifest", type=str, dest="manifest",
+                        required=True, help="manifest written by "
+                        "mongolaunch launch --manifest")
+    parser.add_argument("--version", type=str, dest="version", required=True,
+                        help="MongoDB version to switch to, e.g. 2.6.0")
+    parser.add_argument("--output", type=str, dest="output", default=None,
+                        help="file to write the updated manifest to. "
+                        "Defaults to --manifest.")
+    _aws_arguments(parser)
+
+
+def _add_member_arguments(parser):
+    parser.add_argument("--manifest", type=str, dest="manifest",
+                        required=True, help="manifest written by "
+                        "mongolaunch launch --manifest")
+    parser.add_argument("--set", type=str, dest="set", required=True,
+                        help="_id of the replica set to add a member to")
+    parser.add_argument("--host", type=str, dest="host", required=True,
+                        help="_id of the host or instance in the manifest "
+                        "to run the new member on")
+    parser.add_argument("--port", type=int, dest="port", required=True,
+                        help="port of the new member")
+    parser.add_argument("--id", type=str, dest="id", default=None,
+                        help="_id of the new member. Defaults to "
+                        "<set>_<number of members>.")
+    parser.add_argument("--from", type=str, dest="source", default=None,
+                        help="_id of the member to copy data from. Defaults "
+                        "to the primary. Writes to it are blocked while its "
+                        "data is copied.")
+    parser.add_argument("--dbpath", type=str, dest="dbpath", default=None,
+                        help="dbpath of the new member. Defaults to "
+                        "/data/db-<port>.")
+    parser.add_argument("--logpath", type=str, dest="logpath", default=None,
+                        help="logpath of the new member. Defaults to "
+                        "/var/log/mongod-<port>.log.")
+    parser.add_argument("--output", type=str, dest="output", default=None,
+                        help="file to write the updated manifest to. "
+                        "Defaults to --manifest.")
+    _aws_arguments(parser)
+
+
+def build_parser():
+    '''Return the ArgumentParser for the mongolaunch command'''
+    parser = argparse.ArgumentParser(
+        prog="mongolaunch",
+        description="Launch and manage EC2 MongoDB configurations")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    _launch_arguments(commands.add_parser(
+        "launch", help="launch a configuration"))
+    _terminate_arguments(commands.add_parser(
+        "terminate", help="terminate the EC2 instances in the journal"))
+    _snapshot_arguments(commands.add_parser(
+        "snapshot", help="capture the data of a launched topology"))
+    _profile_arguments(commands.add_parser(
+        "profile", help="profile slow queries on a launched cluster"))
+    _failover_arguments(commands.add_parser(
+        "failover-bench", help="measure how quickly replica sets elect a "
+        "new primary"))
+    _switch_arguments(commands.add_parser(
+        "switch-version", help="restart a launched topology with another "
+        "MongoDB version"))
+    _add_member_arguments(commands.add_parser(
+        "add-member", help="add a member seeded with another member's data "
+        "to a running replica set"))
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Before there were subcommands, mongolaunch only launched
+    if argv and argv[0] not in COMMANDS and argv[0] not in ("-h", "--help"):
+        argv.insert(0, "launch")
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        exit(2)
+    module = COMMANDS[args.command]
+    if args.command == "launch" and args.dry_run:
+        module = "mongolaunch.dryrun"
+    try:
+        importlib.import_module(module).run(args)
+    except errors.MongoLaunchError as e:
+        print("%s: %s" % (args.command, e))
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
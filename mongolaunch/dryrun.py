@@ -0,0 +1,39 @@
+'''Check a configuration and show what launching it would start, without
+importing boto, pymongo or fabric, or talking to EC2 or any host.
+
+'''
+
+import json
+
+from mongolaunch import errors
+from mongolaunch.plan import assignments, check
+
+
+def load_config(filename, snapshot=False):
+    '''Read the configuration in <filename>, or the configuration captured
+    in a snapshot file if <snapshot> is True
+
+    '''
+    try:
+        with open(filename, "r") as fd:
+            config = json.load(fd)
+    except (IOError, ValueError) as e:
+        raise errors.MLConfigurationError(
+            "could not read configuration %s: %s" % (filename, e))
+    return config['config'] if snapshot else config
+
+
+def run(args):
+    '''Run launch --dry-run with arguments parsed by mongolaunch.cli'''
+    if args.resume or args.abandon:
+        raise errors.MLConfigurationError(
+            "--dry-run can't be combined with --resume or --abandon")
+    config = load_config(args.snapshot or args.config_filename,
+                         snapshot=args.snapshot is not None)
+    check(config, args.key_name)
+    print("Configuration %s is valid. Launching it would start:"
+          % config.get("configuration_title", ""))
+    for mongoid, binary, host_id, port in assignments(config, args.port):
+        print("%s\t%s\t%s:%d" % (mongoid, binary, host_id or "-", port))
+    if args.copies > 1:
+        print("in each of %d copies" % args.copies)
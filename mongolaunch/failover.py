@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+'''Measure how quickly launched replica sets fail over: step down or kill the
+primary of each set again and again while a writer keeps inserting, and
+report how long elections take, how long writes are refused and how many
+acknowledged writes are rolled back.
+
+'''
+
+import json
+import sys
+import threading
+import time
+
+import pymongo
+import pymongo.errors
+
+import mongolaunch.cli
+from mongolaunch import errors
+from mongolaunch.models import step_down
+from mongolaunch.topology import attach, load_manifest
+
+# Database the writer inserts into, one collection per trial
+DATABASE = "mongolaunch_failover"
+# Seconds between two checks of who is primary
+POLL_INTERVAL = 0.05
+# Seconds the writer runs before the primary goes away
+WARMUP = 1.0
+# Seconds a stepped down primary can't be elected again
+STEPDOWN_SECS = 60
+
+
+def main():
+    mongolaunch.cli.main(["failover-bench"] + sys.argv[1:])
+
+
+def run(args):
+    '''Run the failover-bench command with arguments parsed by
+    mongolaunch.cli
+
+    '''
+    results = []
+    for filename in args.manifests:
+        manifest = load_manifest(filename)
+        topology = attach(manifest, args.access, args.secret)
+        for rsid, rs in sorted(topology.replicas.items()):
+            if args.sets and rsid not in args.sets:
+                continue
+            if len(rs.members) < 2:
+                print("%s: skipping replica set %s, it has no member to "
+                      "fail over to" % (topology.title, rs.name))
+                continue
+            results.extend(benchmark(topology.title, rs, args.trials,
+                                     args.mode, args.write_interval,
+                                     args.interval, args.timeout))
+    report = {"trials": results, "summary": summarize(results)}
+    with open(args.output, "w") as fd:
+        json.dump(report, fd, indent=4)
+    print_report(report["summary"])
+    print("Wrote report to %s" % args.output)
+
+
+def _client(mongo):
+    # A direct connection that gives up quickly, so that a dead member
+    # doesn't hold up the writer or the election watch
+    return pymongo.MongoClient(mongo.host.hostname(), mongo.port,
+                               connect=False, connectTimeoutMS=1000,
+                               socketTimeoutMS=2000,
+                               serverSelectionTimeoutMS=1000)
+
+
+def _state(client):
+    '''Return "primary", "secondary", or None if the member is in any
+    other state or can't be reached
+
+    '''
+    try:
+        reply = client.admin.command("isMaster")
+    except pymongo.errors.PyMongoError:
+        return None
+    if reply.get("ismaster"):
+        return "primary"
+    if reply.get("secondary"):
+        return "secondary"
+    return None
+
+
+def wait_for_primary(clients, timeout, exclude=None):
+    '''Wait for a member other than <exclude> to be primary. Returns its
+    _id, or None after <timeout> seconds.
+
+    '''
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        for member, client in clients.items():
+            if member != exclude and _state(client) == "primary":
+                return member
+        time.sleep(POLL_INTERVAL)
+    return None
+
+
+def wait_for_healthy(clients, timeout):
+    '''Wait for one member to be primary and all others to be secondaries.
+    Returns False after <timeout> seconds.
+
+    '''
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        states = [_state(c) for c in clients.values()]
+        if states.count("primary") == 1 and \
+                states.count("secondary") == len(states) - 1:
+            return True
+        time.sleep(POLL_INTERVAL)
+    return False
+
+
+class Writer(threading.Thread):
+    '''Inserts numbered documents into <collection> on whichever member is
+    primary, every <interval> seconds, until stopped. Writes are
+    acknowledged by the primary alone, like the default write concern.
+
+    acked       (time, _id) of every acknowledged insert
+    failed      number of inserts that were refused or lost
+    down        _ids of members known to be down, which are not probed
+                when looking for a new primary
+
+    '''
+
+    def __init__(self, clients, collection, interval):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.clients = clients
+        self.collection = collection
+        self.interval = interval
+        self.acked = []
+        self.failed = 0
+        self.down = set()
+        self._stopped = threading.Event()
+
+    def run(self):
+        primary = None
+        seq = 0
+        while not self._stopped.is_set():
+            if primary is None:
+                # A killed member would hold each probe up until the
+                # connection times out
+                for member, client in self.clients.items():
+                    if member not in self.down and \
+                            _state(client) == "primary":
+                        primary = member
+                        break
+                else:
+                    time.sleep(POLL_INTERVAL)
+                    continue
+            seq += 1
+            collection = self.clients[primary][DATABASE][self.collection]
+            try:
+                collection.insert_one({"_id": seq, "ts": time.time()})
+                self.acked.append((time.time(), seq))
+            except pymongo.errors.PyMongoError:
+                self.failed += 1
+                primary = None
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def gap(self, since):
+        '''Return the seconds between the last acknowledged write before
+        <since> and the first one after it, or None if none came after
+
+        '''
+        before = [t for t, _ in self.acked if t <= since]
+        after = [t for t, _ in self.acked if t > since]
+        if not after:
+            return None
+        return after[0] - (before[-1] if before else since)
+
+
+def trial(rs, clients, number, mode, write_interval, timeout):
+    '''Make the primary of <rs> go away once, and measure what happens.
+    Returns a dict describing the trial, with an "error" if the set did not
+    recover. Raises MLConnectionError if there is no primary to begin with.
+
+    '''
+    members = dict((m.config['_id'], m) for m in rs.members)
+    old = wait_for_primary(clients, timeout)
+    if old is None:
+        raise errors.MLConnectionError(
+            "replica set %s has no primary" % rs.name)
+    writer = Writer(clients, "trial%d" % number, write_interval)
+    writer.start()
+    time.sleep(WARMUP)
+
+    try:
+        if mode == "kill":
+            writer.down.add(old)
+            members[old].kill()
+            # The process is gone once the command returns
+            started = time.time()
+        else:
+            started = time.time()
+            step_down(clients[old], STEPDOWN_SECS, force=True)
+    except BaseException:
+        writer.stop()
+        raise
+    new = wait_for_primary(clients, timeout, exclude=old)
+    elected = time.time()
+    deadline = started + timeout
+    while writer.gap(started) is None and time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+    writer.stop()
+
+    result = {
+        "set": rs.name,
+        "trial": number,
+        "mode": mode,
+        "old_primary": old,
+        "new_primary": new,
+        "old_version": members[old].config.get('version'),
+        "new_version": new and members[new].config.get('version'),
+        "time_to_primary": None if new is None else elected - started,
+        "write_unavailable": writer.gap(started),
+        "acked": len(writer.acked),
+        "failed": writer.failed,
+        "rolled_back": None
+    }
+    try:
+        if mode == "kill":
+            members[old].restart()
+        if not wait_for_healthy(clients, timeout):
+            raise errors.MLConnectionError(
+                "replica set %s did not recover after trial %d" % (rs.name,
+                                                                    number))
+        if mode == "stepdown":
+            # Let the old primary be elected again in the next trials
+            clients[old].admin.command("replSetFreeze", 0)
+        # The old primary rolled back whatever the new one never got
+        primary = wait_for_primary(clients, timeout)
+        collection = clients[primary][DATABASE]["trial%d" % number]
+        kept = set(doc['_id'] for doc in collection.find({}, {"_id": 1}))
+        result["rolled_back"] = len([seq for _, seq in writer.acked
+                                     if seq not in kept])
+        collection.drop()
+    except (errors.MongoLaunchError, pymongo.errors.PyMongoError) as e:
+        result["error"] = str(e)
+    return result
+
+
+def benchmark(title, rs, trials, mode, write_interval, interval, timeout):
+    '''Run <trials> trials against the replica set <rs>, <interval> seconds
+    apart. Returns the list of trials, each labeled with <title> and the
+    versions of the members of the set.
+
+    '''
+    clients = dict((m.config['_id'], _client(m)) for m in rs.members)
+    versions = "+".join(sorted(set(
+        str(m.config.get('version')) for m in rs.members)))
+    results = []
+    try:
+        for number in range(trials):
+            try:
+                result = trial(rs, clients, number, mode, write_interval,
+                               timeout)
+            except (errors.MongoLaunchError,
+                    pymongo.errors.PyMongoError) as e:
+                # Keep what was measured so far, and try again next trial
+                result = {"set": rs.name, "trial": number, "mode": mode,
+                          "old_primary": None, "new_primary": None,
+                          "old_version": None, "new_version": None,
+                          "time_to_primary": None, "write_unavailable": None,
+                          "acked": 0, "failed": 0, "rolled_back": None,
+                          "error": str(e)}
+            result["topology"] = title
+            result["versions"] = versions
+            print("%s %s trial %d: %s -> %s, new primary after %s, writes "
+                  "refused for %s, %s rolled back%s" % (
+                      title, rs.name, number, result["old_primary"],
+                      result["new_primary"],
+                      _seconds(result["time_to_primary"]),
+                      _seconds(result["write_unavailable"]),
+                      result["rolled_back"],
+                      " (%s)" % result["error"] if "error" in result else ""))
+            results.append(result)
+            time.sleep(interval)
+    finally:
+        for client in clients.values():
+            client.close()
+    return results
+
+
+def distribution(values):
+    '''Return the count, min, median, 90th percentile, max and mean of
+    <values>, ignoring None, which is counted as a timeout
+
+    '''
+    measured = sorted(v for v in values if v is not None)
+    stats = {"count": len(measured),
+             "timeouts": len(values) - len(measured)}
+    if measured:
+        stats.update({
+            "min": measured[0],
+            "median": measured[len(measured) // 2],
+            "p90": measured[min(len(measured) - 1,
+                                int(len(measured) * 0.9))],
+            "max": measured[-1],
+            "mean": sum(measured) / len(measured)
+        })
+    return stats
+
+
+def summarize(results):
+    '''Group trials by topology and replica set, and by the versions of the
+    old and new primaries, and describe each group
+
+    '''
+    groups = {}
+    for result in results:
+        keys = [
+            ("set", "%s/%s" % (result["topology"], result["set"]),
+             result["versions"]),
+            ("versions", "%s -> %s" % (result["old_version"],
+                                       result["new_version"]),
+             result["versions"])
+        ]
+        for key in keys:
+            groups.setdefault(key, []).append(result)
+    summary = []
+    for (kind, name, versions), group in sorted(groups.items()):
+        summary.append({
+            "group": kind,
+            "name": name,
+            "versions": versions,
+            "mode": ",".join(sorted(set(r["mode"] for r in group))),
+            "time_to_primary": distribution(
+                [r["time_to_primary"] for r in group]),
+            "write_unavailable": distribution(
+                [r["write_unavailable"] for r in group]),
+            "acked": sum(r["acked"] for r in group),
+            "rolled_back": sum(r["rolled_back"] or 0 for r in group),
+            "errors": len([r for r in group if "error" in r])
+        })
+    return summary
+
+
+def _seconds(value):
+    return "timeout" if value is None else "%.3fs" % value
+
+
+def print_report(summary):
+    print("%-30s %-20s %6s %9s %9s %9s %9s %9s %6s" % (
+        "set / primary versions", "versions", "trials", "elect p50",
+        "elect p90", "write p50", "write p90", "rollback", "errors"))
+    for stats in summary:
+        elect = stats["time_to_primary"]
+        write = stats["write_unavailable"]
+        print("%-30s %-20s %6d %9s %9s %9s %9s %9d %6d" % (
+            stats["name"], stats["versions"],
+            elect["count"] + elect["timeouts"],
+            _seconds(elect.get("median")), _seconds(elect.get("p90")),
+            _seconds(write.get("median")), _seconds(write.get("p90")),
+            stats["rolled_back"], stats["errors"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+'''Append-only record of the steps completed by launches.
+
+Every step is one JSON line in settings.JOURNAL_PATH, written with a single
+append and flushed to disk before the launch moves on, so the journal
+survives the launcher crashing or being interrupted at any point. Steps
+are:
+
+launch_started      the configuration and options of a launch
+instance_launched   an EC2 instance was started, with its id
+host_initialized    the install script ran on one of your own machines
+process_started     a mongod or mongos is accepting connections
+set_initiated       a replica set is configured
+shard_added         a shard is part of a sharded cluster
+seed_loaded         an entry of the "seed" section is loaded
+launch_finished     everything is up
+instance_terminated an EC2 instance was terminated
+launch_closed       the launch was torn down or abandoned, and is not to
+                    be resumed
+
+'''
+
+import json
+import os
+import os.path
+import threading
+import time
+import uuid
+
+from mongolaunch import settings
+
+# Appends from the threads of one process go through one lock per file
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _lock_for(path):
+    with _locks_lock:
+        return _locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def read_journal(path=None):
+    '''Return every step recorded in the journal at <path>, oldest first'''
+    path = path or settings.JOURNAL_PATH
+    steps = []
+    try:
+        with open(path, "r") as fd:
+            for line in fd:
+                try:
+                    steps.append(json.loads(line))
+                except ValueError:
+                    # The last line is cut short if the launcher died while
+                    # writing it
+                    continue
+    except IOError:
+        pass
+    return steps
+
+
+def unfinished_launches(path=None):
+    '''Return the launch_started steps of the launches in the journal at
+    <path> that never finished and were not closed
+
+    '''
+    started = []
+    finished = set()
+    for step in read_journal(path):
+        if step['step'] == 'launch_started':
+            started.append(step)
+        elif step['step'] in ('launch_finished', 'launch_closed'):
+            finished.add(step['launch'])
+    return [s for s in started if s['launch'] not in finished]
+
+
+def abandon_launches(path=None):
+    '''Close every unfinished launch in the journal at <path>, so that
+    --resume leaves them alone. Returns their launch_started steps.
+
+    '''
+    launches = unfinished_launches(path)
+    for started in launches:
+        Journal(started['launch'], path).record("launch_closed",
+                                                reason="abandoned")
+    return launches
+
+
+def live_instances(path=None):
+    '''Return the instance_launched steps for every EC2 instance in the
+    journal at <path> that was not terminated since
+
+    '''
+    launched = []
+    terminated = set()
+    for step in read_journal(path):
+        if step['step'] == 'instance_launched':
+            launched.append(step)
+        elif step['step'] == 'instance_terminated':
+            terminated.add(step['instance_id'])
+    return [s for s in launched if s['instance_id'] not in terminated]
+
+
+class Journal(object):
+    '''The steps of one launch
+
+    launch_id       identifies the launch in the journal. A new one is
+                    made up if not given.
+    path            journal file. Defaults to settings.JOURNAL_PATH.
+
+    '''
+
+    def __init__(self, launch_id=None, path=None):
+        self.launch_id = launch_id or uuid.uuid4().hex
+        self.path = path or settings.JOURNAL_PATH
+        self._lock = _lock_for(self.path)
+
+    def record(self, step, **fields):
+        '''Append <step> with <fields> to the journal'''
+        fields.update(step=step, launch=self.launch_id, ts=time.time())
+        line = json.dumps(fields, sort_keys=True) + "\n"
+        with self._lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                         0o600)
+            try:
+                # Finish a line that was cut short, so this one parses
+                size = os.fstat(fd).st_size
+                if size and not self._ends_with_newline(size):
+                    line = "\n" + line
+                os.write(fd, line.encode("utf-8"))
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _ends_with_newline(self, size):
+        with open(self.path, "rb") as fd:
+            fd.seek(size - 1)
+            return fd.read(1) == b"\n"
+
+    def steps(self):
+        '''Return the steps recorded for this launch, oldest first'''
+        return [s for s in read_journal(self.path)
+                if s['launch'] == self.launch_id]
+
+
+class Progress(object):
+    '''What a launch got done, according to its steps in a journal'''
+
+    def __init__(self, steps):
+        self.started = None
+        self.instances = {}
+        self.hosts = set()
+        self.sets = set()
+        self.shards = set()
+        self.seeds = set()
+        for step in steps:
+            kind = step['step']
+            if kind == 'launch_started':
+                self.started = step
+            elif kind == 'instance_launched':
+                self.instances[step['host']] = step['instance_id']
+            elif kind == 'instance_terminated':
+                # Launch a new one on resume
+                self.instances.pop(step['host'], None)
+            elif kind == 'host_initialized':
+                self.hosts.add(step['host'])
+            elif kind == 'set_initiated':
+                self.sets.add(step['set'])
+            elif kind == 'shard_added':
+                self.shards.add((step['cluster'], step['shard']))
+            elif kind == 'seed_loaded':
+                self.seeds.add(step['index'])
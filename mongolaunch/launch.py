@@ -1,89 +1,176 @@
 #!/usr/bin/env python
 
-import argparse
-import itertools
 import json
 import os
 import os.path
-import pickle
+import sys
+import threading
 import time
 
 import boto.ec2 as ec2
-from boto.exception import BotoServerError
 import pymongo
 import pymongo.errors
 
 from mongolaunch import errors
+from mongolaunch.cache import MetadataCache
+from mongolaunch.journal import (
+    Journal,
+    Progress,
+    abandon_launches,
+    unfinished_launches
+)
 from mongolaunch.settings import (
+    ADDRESSING_POLICIES,
     ML_PATH,
     CONFIG_AMI,
     MAX_MONGO_TRIES
 )
+import mongolaunch.cli
 import mongolaunch.models
+import mongolaunch.monitor
+import mongolaunch.seed
+import mongolaunch.snapshot
+from mongolaunch.parallel import run_parallel
+from mongolaunch.plan import (
+    assign_ports,
+    check,
+    configdb_hosts,
+    copy_config,
+    ports_needed
+)
+from mongolaunch.readiness import Readiness
+from mongolaunch.topology import Topology
 
 # Configurables defined as globals up here for now
 CIDR_ADDRESS = "0.0.0.0/0"
 
 
 def main():
-    parser = argparse.ArgumentParser(
-        description="Launch EC2 MongoDB configurations")
-    parser.add_argument("--key-name", type=str, dest="key_name", default=None,
-                        help="key pair name")
-    parser.add_argument("--config", type=str, dest="config_filename",
-                        default="config.json", help="JSON configuration file")
-    parser.add_argument("--start-port", type=int, dest="port", default=27017,
-                        help="starting port for mongo processes")
-    parser.add_argument("--security-group", type=str, dest="sec_group", help=
-                        "security group name", default="mongolaunch")
-    parser.add_argument("--region", type=str, dest="region", help="AWS region",
-                        default="us-west-1")
-    parser.add_argument("-z", "--availability-zone", dest='zone',
-                        action='store', default=None, help="availability zone")
-    parser.add_argument("--instance-type", type=str, dest="instance_type",
-                        default="t1.micro", help="EC2 instance type. Defaults "
-                        "to t1.micro")
-    parser.add_argument("--secret-key", type=str, dest="secret", help=
-                        "AWS secret key. This can be omitted if AWS_SECRET_KEY "
-                        "is defined in your environment", default=None)
-    parser.add_argument("-t", "--tag", type=str, dest="tags", action="append",
-                        help="Add a tag with --tag key=value or --tag tagname",
-                        default=[])
-    parser.add_argument("--access-key", type=str, dest="access", help=
-                        "AWS access key. This can be omitted if AWS_ACCESS_KEY "
-                        "is defined in your environment", default=None)
-
-    args = parser.parse_args()
-    region = args.region
-    sec_group = args.sec_group
-    key_name = args.key_name
-    secret = args.secret or os.environ.get("AWS_SECRET_KEY")
-    access = args.access or os.environ.get("AWS_ACCESS_KEY")
-    start_port = args.port
-    if start_port < 0 or start_port > 65535:
-        raise errors.MLConfigurationError(
-            "--start-port out of range: %d" % start_port)
-    tags = args.tags
-    zone = args.zone
-    instance_type = args.instance_type
-    config_filename = args.config_filename
+    mongolaunch.cli.main(["launch"] + sys.argv[1:])
 
-    # Record how long all setup takes
-    start_time = time.time()
+
+def run(args):
+    '''Run the launch command with arguments parsed by mongolaunch.cli'''
+    config_filename = args.snapshot or args.config_filename
+
+    if args.abandon:
+        abandoned = abandon_launches(args.journal)
+        for started in abandoned:
+            print("abandoned launch %s of %s" % (
+                started['launch'],
+                started['config'].get("configuration_title", "")))
+        print("%d launches abandoned" % len(abandoned))
+        return
 
     # Open config file
-    try:
-        with open(config_filename, "r") as fd:
-            try:
-                config = json.load(fd)
-            except ValueError:
-                print("Invalid configuration file: %s" % config_filename)
-                raise
-    except IOError:
-        print("Could not open configuration file %s. Is it readable?"
-              % config_filename)
-        exit(1)
+    config = None
+    snapshots = None
+    if not args.resume:
+        try:
+            with open(config_filename, "r") as fd:
+                try:
+                    config = json.load(fd)
+                except ValueError:
+                    print("Invalid configuration file: %s" % config_filename)
+                    raise
+        except IOError:
+            print("Could not open configuration file %s. Is it readable?"
+                  % config_filename)
+            exit(1)
+    if args.snapshot is not None and not args.resume:
+        if args.copies > 1:
+            print("--from-snapshot can't be combined with --copies")
+            exit(1)
+        snapshots = config['snapshots']
+        config = config['config']
+
+    tags = {}
+    for tag in args.tags:
+        key, _, value = tag.partition("=")
+        tags[key] = value
+
+    options = dict(key_name=args.key_name,
+                   region=args.region,
+                   sec_group=args.sec_group,
+                   start_port=args.port,
+                   instance_type=args.instance_type,
+                   access=args.access,
+                   secret=args.secret,
+                   tags=tags,
+                   zone=args.zone,
+                   callback_url=args.callback_url,
+                   refresh_cache=args.refresh_cache,
+                   seed_workers=args.seed_workers,
+                   snapshots=snapshots,
+                   addressing=args.addressing)
+    start_time = time.time()
+    if args.resume:
+        # Everything else was recorded when the launches started
+        topologies = resume(args.journal,
+                            access=args.access,
+                            secret=args.secret,
+                            callback_url=args.callback_url,
+                            refresh_cache=args.refresh_cache,
+                            seed_workers=args.seed_workers)
+    elif args.copies > 1:
+        topologies = launch_fleet(config, args.copies,
+                                  journal=Journal(path=args.journal),
+                                  **options)
+    else:
+        topologies = [launch(config, journal=Journal(path=args.journal),
+                             **options)]
+
+    #
+    # Print out results
+    #
 
+    print("")
+    print("Done. Setup took %f seconds" % (time.time() - start_time))
+    print("Started the following mongo processes:")
+    for i, topology in enumerate(topologies):
+        for mongoid, mongo in topology.mongoes.items():
+            print("%s\t%s:%d" % (mongoid, mongo.host.hostname(), mongo.port))
+            if isinstance(mongo, mongolaunch.models.Mongos):
+                for cdb in mongo.configdbs:
+                    print("%s\t%s:%d" % (cdb.host.id,
+                                         cdb.host.hostname(),
+                                         cdb.port))
+        if args.manifest is not None:
+            manifest = args.manifest
+            if len(topologies) > 1:
+                base, ext = os.path.splitext(args.manifest)
+                manifest = "%s-c%d%s" % (base, i, ext)
+            topology.save(manifest)
+            print("Wrote manifest to %s" % manifest)
+
+    #
+    # Monitor
+    #
+
+    if args.monitor:
+        print("")
+        print("Monitoring every %g seconds. Press Ctrl-C to stop."
+              % args.monitor_interval)
+        endpoints = []
+        for topology in topologies:
+            endpoints.extend(mongolaunch.monitor.endpoints(
+                topology.mongoes, topology.replicas))
+        monitor = mongolaunch.monitor.Monitor(
+            endpoints,
+            interval=args.monitor_interval,
+            jsonl_path=args.monitor_jsonl,
+            prometheus_port=args.monitor_port
+        )
+        monitor.run()
+
+
+def connect(region, access=None, secret=None):
+    '''Return an EC2Connection to <region>. access and secret default to
+    AWS_ACCESS_KEY and AWS_SECRET_KEY from the environment.
+
+    '''
+    secret = secret or os.environ.get("AWS_SECRET_KEY")
+    access = access or os.environ.get("AWS_ACCESS_KEY")
     if not secret or not access:
         raise errors.MLConfigurationError(
             "You must have both AWS_ACCESS_KEY and AWS_SECRET_KEY "
@@ -95,23 +182,35 @@ def main():
     if conn is None:
         raise errors.MLConnectionError(
             "Could not connect to region %s!" % region)
+    return conn
+
+
+def prepare_region(conn, key_name, sec_group, cache, key_dir=ML_PATH):
+    '''Create the key pair and security group used by mongolaunch in the
+    region of <conn>, if they don't exist yet. <cache> is the MetadataCache
+    for the region. New private keys are saved in <key_dir>.
+
+    '''
 
     #
     # Get or create KeyPair
     #
 
     if key_name is not None:
-        if not key_name in (kp.name for kp in conn.get_all_key_pairs()):
+        if not cache.key_pair_exists(key_name):
             print("keypair %s does not yet exist. Creating it..." % key_name)
             keypair = conn.create_key_pair(key_name)
-            keypair.save(ML_PATH)
+            if not os.path.isdir(key_dir):
+                os.makedirs(key_dir)
+            keypair.save(key_dir)
+            cache.remember("key_pairs", key_name)
 
     #
     # Get or create security group
     #
 
     if sec_group is not None:
-        if not sec_group in (g.name for g in conn.get_all_security_groups()):
+        if not cache.security_group_exists(sec_group):
             print("security group %s does not yet exist. Creating it..."
                   % sec_group)
             rules = [
@@ -123,6 +222,176 @@ def main():
                                            "mongolaunch security group")
             for rule in rules:
                 g.authorize(*rule)
+            cache.remember("security_groups", sec_group)
+
+
+class Region(object):
+    '''An EC2 region, with the connection and state shared by everything
+    launched in it
+
+    '''
+
+    def __init__(self, name, access=None, secret=None, conn=None,
+                 refresh_cache=False, key_dir=ML_PATH):
+        self.name = name
+        self.conn = conn or connect(name, access, secret)
+        self.cache = MetadataCache(self.conn, refresh=refresh_cache)
+        self.tracker = mongolaunch.models.InstanceTracker(self.conn)
+        self.key_dir = key_dir
+        self._prepared = False
+        self._lock = threading.Lock()
+
+    def prepare(self, key_name, sec_group):
+        '''Call prepare_region() for this region, once'''
+        with self._lock:
+            if not self._prepared:
+                prepare_region(self.conn, key_name, sec_group, self.cache,
+                               self.key_dir)
+                self._prepared = True
+
+
+def get_regions(config, default_region, regions=None, **kwargs):
+    '''Return a mapping of region name to Region for every region used by
+    <config>, adding to <regions> if given. Private keys for regions other
+    than <default_region> are kept in a sub-directory of ML_PATH named
+    after the region. Other arguments are passed to Region.
+
+    '''
+    regions = {} if regions is None else regions
+    names = set([default_region])
+    names.update(inst['region'] for inst in config.get('instances', [])
+                 if 'region' in inst)
+    for name in names:
+        if name not in regions:
+            key_dir = ML_PATH
+            if name != default_region:
+                key_dir = os.path.join(ML_PATH, name)
+            regions[name] = Region(name, key_dir=key_dir, **kwargs)
+    return regions
+
+
+def provision(hosts):
+    '''Start all EC2 Instances in <hosts> that don't depend on any other
+    host, with the regions being provisioned at the same time
+
+    '''
+    by_region = {}
+    for host in hosts:
+        if isinstance(host, mongolaunch.models.Instance) and \
+                host.can_initialize_early():
+            by_region.setdefault(host.region, []).append(host)
+
+    def provision_region(instances):
+        return lambda: [inst.initialize() for inst in instances]
+    run_parallel([provision_region(instances)
+                  for instances in by_region.values()])
+
+
+def spread_members(replicas, regions):
+    '''Put the EC2 Instances of the members of each replica set in
+    <replicas> in different availability zones, unless they were given a
+    zone already
+
+    '''
+    for rs in replicas.values():
+        by_region = {}
+        for member in rs.members:
+            host = member.host
+            if isinstance(host, mongolaunch.models.Instance) and \
+                    host.zone is None:
+                members = by_region.setdefault(host.region, [])
+                if host not in members:
+                    members.append(host)
+        for region, instances in by_region.items():
+            zones = regions[region].cache.available_zones()
+            for i, host in enumerate(instances):
+                host.zone = zones[i % len(zones)]
+
+
+def launch(config, key_name=None, region="us-west-1",
+           sec_group="mongolaunch", start_port=27017, instance_type="t1.micro",
+           access=None, secret=None, conn=None, tags=None, zone=None,
+           seed_workers=None, regions=None, refresh_cache=False,
+           callback_url=None, readiness=None, snapshots=None, journal=None,
+           addressing="auto"):
+    '''Launch everything described by the configuration document <config>,
+    returning a Topology once all processes are up, replica sets have a
+    primary, and seed data is loaded.
+
+    Instances go in <region> unless their configuration says otherwise.
+    access and secret default to AWS_ACCESS_KEY and AWS_SECRET_KEY from the
+    environment. An existing EC2Connection to <region> may be passed as
+    <conn>. <tags> are added to every EC2 instance. <zone> is the default
+    availability zone for instances in <region>. Instances without a zone
+    that host replica set members are spread across zones. <regions> maps
+    region names to Region objects, and may be shared between launches to
+    save EC2 requests. <refresh_cache> ignores metadata cached by earlier
+    runs. Install scripts report their progress to a listener at
+    <callback_url>, or to <readiness> (a Readiness shared with other
+    launches) if given. <addressing> is how processes address each other:
+    "public" hostnames, "private" addresses, or "auto" to use private ones
+    when all hosts are on the same network (see models.addresses()).
+    <snapshots> is the "snapshots" section written by
+    mongolaunch snapshot, and restores the data of every mongod from it.
+
+    Every completed step is recorded in <journal>, a Journal, if given. If
+    the journal already has steps for this launch, the hosts, replica sets
+    and clusters they cover are attached to and only the rest is done.
+
+    '''
+    if readiness is None:
+        readiness = Readiness(callback_url)
+        readiness.start()
+        try:
+            return launch(config, key_name=key_name, region=region,
+                          sec_group=sec_group, start_port=start_port,
+                          instance_type=instance_type, access=access,
+                          secret=secret, conn=conn, tags=tags, zone=zone,
+                          seed_workers=seed_workers, regions=regions,
+                          refresh_cache=refresh_cache, readiness=readiness,
+                          snapshots=snapshots, journal=journal,
+                          addressing=addressing)
+        finally:
+            readiness.stop()
+
+    if start_port < 0 or start_port > 65535:
+        raise errors.MLConfigurationError(
+            "start port out of range: %d" % start_port)
+    if addressing not in ADDRESSING_POLICIES:
+        raise errors.MLConfigurationError(
+            "addressing must be one of %s, not %s" % (
+                ", ".join(ADDRESSING_POLICIES), addressing))
+    check(config, key_name)
+    title = config.get("configuration_title", "")
+
+    progress = None
+    if journal is not None:
+        progress = Progress(journal.steps())
+        if progress.started is None:
+            journal.record("launch_started", config=config, options={
+                "key_name": key_name,
+                "region": region,
+                "sec_group": sec_group,
+                "start_port": start_port,
+                "instance_type": instance_type,
+                "tags": tags,
+                "zone": zone,
+                "snapshots": snapshots,
+                "addressing": addressing
+            })
+
+    # Record how long all setup takes
+    start_time = time.time()
+
+    if regions is None:
+        regions = {}
+        if conn is not None:
+            regions[region] = Region(region, conn=conn,
+                                     refresh_cache=refresh_cache)
+    regions = get_regions(config, region, regions, access=access,
+                          secret=secret, refresh_cache=refresh_cache)
+    run_parallel([lambda r=r: r.prepare(key_name, sec_group)
+                  for r in regions.values()])
 
     #
     # Create Host models
@@ -133,19 +402,22 @@ def main():
 
     # EC2
     for to_start in config.get('instances', []):
-        # TODO: isolate this kind of logic, and do all config file
-        # validation at once
-        if key_name is None:
-            raise errors.MLConfigurationError(
-                "Config file %s has EC2 instances, but no key was provided. "
-                "Abandoning setup." % config_filename)
+        inst_region = regions[to_start.get('region', region)]
+        inst_zone = to_start.get('zone')
+        if inst_zone is None and inst_region.name == region:
+            inst_zone = zone
         model = mongolaunch.models.Instance(
             id=to_start['_id'],
-            conn=conn,
+            conn=inst_region.conn,
             ami=to_start['ami'],
             keypair=key_name,
             group=sec_group,
-            instance_type=to_start.get("type", instance_type)
+            instance_type=to_start.get("type", instance_type),
+            windows=inst_region.cache.image_is_windows(to_start['ami']),
+            tags=tags,
+            tracker=inst_region.tracker,
+            zone=inst_zone,
+            key_file=os.path.join(inst_region.key_dir, "%s.pem" % key_name)
         )
         hosts[to_start['_id']] = model
 
@@ -164,17 +436,14 @@ def main():
     # Create models of Mongo processes
     #
 
-    # next available port #
-    # this is somewhat dependent on security group rules
-    available_port = itertools.count(start_port)
-
+    ports = assign_ports(config, start_port)
     mongoes = {}
     for mongo in config['mongo']:
         configdbs = []
+        port, config_ports = ports[mongo['_id']]
         if mongo['bin'].lower() == 'mongos':
             # Create config server(s)
-            for i in range(1 if mongo['single_configdb'] else 3):
-                config_port = next(available_port)
+            for config_port in config_ports:
                 configdb = mongolaunch.models.Mongod(
                     port=config_port,
                     config={
@@ -194,7 +463,7 @@ def main():
             model = mongolaunch.models.Mongos(
                 config=mongo,
                 configdbs=configdbs,
-                port=mongo.get("port", next(available_port))
+                port=port
             )
             # N.B. 'configdbs' are not in this mapping, since there is
             # no config id
@@ -202,17 +471,12 @@ def main():
         elif mongo['bin'].lower() == 'mongod':
             model = mongolaunch.models.Mongod(
                 config=mongo,
-                port=mongo.get("port", next(available_port))
+                port=port
             )
             mongoes[mongo['_id']] = model
 
         # Attach mongo process model to appropriate Host model
-        host_id = mongo.get("instance") or mongo.get("host")
-        host = hosts.get(host_id)
-        if host is None:
-            raise errors.MLConfigurationError(
-                "no host %s found for %s!" % (host_id, mongo['_id']))
-        host.add_mongo(model)
+        hosts[mongo.get("instance") or mongo.get("host")].add_mongo(model)
 
     #
     # Create models of replicas
@@ -232,46 +496,81 @@ def main():
     #
 
     sharded = {}
+    config_hosts = configdb_hosts(config)
     for sh in config.get("clusters", []):
         shard_ids = sh['shards']
         mongos = mongoes.get(sh['mongos'])
         shards = [mongoes.get(k, replicas.get(k)) for k in shard_ids]
         model = mongolaunch.models.ShardedCluster(mongos=mongos, shards=shards)
 
-        # Determine if the configdbs should run on the same Host as the Mongos,
-        # or different. If any of the shards are not on the same Host as the
-        # Mongos, then so must the config servers
-        #
-        #TODO: should same_host just check the .host property?
-        def same_host(mongos, shard):
-            host = lambda m: m.config.get("host", m.config.get("instance"))
-            if hasattr(shard, 'members'):
-                # ReplicaSet
-                return all((host(m) == host(mongos)) for m in shard.members)
-            # Standalone
-            return host(mongos) == host(shard)
-
-        # Assign Hosts to config server Mongods
-        for i, configdb in enumerate(mongos.configdbs):
-            if all(same_host(mongos, shard) for shard in shards):
-                # Config servers must live on Mongos Host
+        # Assign Hosts to config server Mongods (see plan.configdb_hosts)
+        for host_id, configdb in zip(config_hosts[sh['mongos']],
+                                     mongos.configdbs):
+            if host_id == mongos.host.id:
                 print("Putting configs on same host as mongoS!")
                 mongos.host.add_mongo(configdb)
             else:
                 print("Putting configs on separate host from mongoS!")
-                # Config servers must live on other EC2 Instances
+                default = regions[region]
                 new_instance = mongolaunch.models.Instance(
-                    id="config%d_inst" % i,
-                    conn=conn,
+                    id=host_id,
+                    conn=default.conn,
                     ami=CONFIG_AMI,
                     keypair=key_name,
                     group=sec_group,
-                    instance_type=instance_type
+                    instance_type=instance_type,
+                    windows=default.cache.image_is_windows(CONFIG_AMI),
+                    tags=tags,
+                    tracker=default.tracker,
+                    zone=zone
                 )
                 new_instance.add_mongo(configdb)
 
         sharded[sh['_id']] = model
 
+    #
+    # Restore data from a snapshot
+    #
+
+    if snapshots is not None:
+        processes = dict(mongoes)
+        for mongo in mongoes.values():
+            for cdb in getattr(mongo, 'configdbs', []):
+                processes[cdb.config['_id']] = cdb
+        all_hosts = dict((m.host.id, m.host) for m in processes.values())
+        for mongoid, snapshot in snapshots.items():
+            if mongoid not in processes:
+                raise errors.MLConfigurationError(
+                    "snapshot has data for %s, which is not in the "
+                    "configuration. Config servers are named after their "
+                    "port, so use the same --start-port as the launch that "
+                    "was captured." % mongoid)
+            processes[mongoid].restore_from = mongolaunch.snapshot. \
+                restore_point(snapshot, all_hosts)
+
+    #
+    # Start EC2 instances
+    #
+
+    spread_members(replicas, regions)
+    all_hosts = set(m.host for m in mongoes.values())
+    for mongos in mongoes.values():
+        all_hosts.update(c.host for c in getattr(mongos, 'configdbs', []))
+    # Decided once for the whole launch, from the configuration alone, so
+    # that replica set configurations, --configdb and addShard agree
+    host_addressing = mongolaunch.models.resolve_addressing(all_hosts,
+                                                            addressing)
+    print("Processes reach each other by %s address" % host_addressing)
+    for host in all_hosts:
+        host.readiness = readiness
+        host.journal = journal
+        host.addressing = host_addressing
+    for cluster in list(replicas.values()) + list(sharded.values()):
+        cluster.journal = journal
+    if progress is not None:
+        reattach(progress, all_hosts, replicas, sharded)
+    provision(all_hosts)
+
     #
     # Configure replica sets
     #
@@ -317,19 +616,211 @@ def main():
             mongo.start()
 
     #
-    # Print out results
+    # Load seed data
     #
 
-    print("")
-    print("Done. Setup took %f seconds" % (time.time() - start_time))
-    print("Started the following mongo processes:")
-    for mongoid, mongo in mongoes.items():
-        print("%s\t%s:%d" % (mongoid, mongo.host.hostname(), mongo.port))
-        if isinstance(mongo, mongolaunch.models.Mongos):
-            for cdb in mongo.configdbs:
-                print("%s\t%s:%d" % (cdb.host.id,
-                                     cdb.host.hostname(),
-                                     cdb.port))
+    targets = dict(mongoes)
+    targets.update(replicas)
+    targets.update(sharded)
+    mongolaunch.seed.seed_from_config(config, targets, workers=seed_workers,
+                                      journal=journal)
+    if journal is not None:
+        journal.record("launch_finished")
+
+    return Topology(title=title,
+                    mongoes=mongoes,
+                    replicas=replicas,
+                    clusters=sharded,
+                    duration=time.time() - start_time,
+                    config=config)
+
+
+def reattach(progress, hosts, replicas, clusters):
+    '''Attach the models in <hosts>, <replicas> and <clusters> to whatever
+    <progress>, a Progress, says was already launched, so that launch()
+    only does what remains
+
+    '''
+    for host in hosts:
+        if host.id in progress.instances:
+            host.attach(progress.instances[host.id])
+        elif host.id in progress.hosts:
+            host.attach()
+        else:
+            continue
+        # Install scripts on this host reported already, and won't again
+        host.readiness = None
+        print("Resuming with %s" % host)
+    for rsid, rs in replicas.items():
+        if rsid in progress.sets:
+            rs.attach()
+    for cluster in clusters.values():
+        mongos_id = cluster.mongos.config['_id']
+        if all((mongos_id, sh.config['_id']) in progress.shards
+               for sh in cluster.shards):
+            cluster.attach()
+
+
+def resume(path=None, **kwargs):
+    '''Finish every launch in the journal at <path> that never finished,
+    returning a list of Topology objects. <kwargs> are passed to launch(),
+    on top of the options each launch was started with.
+
+    '''
+    launches = unfinished_launches(path)
+    if not launches:
+        raise errors.MLConfigurationError(
+            "no unfinished launches to resume in the journal")
+    readiness = Readiness(kwargs.pop('callback_url', None))
+    threads = []
+    for started in launches:
+        options = dict(started['options'])
+        options.update(kwargs)
+        threads.append(LaunchThread(
+            started['config'],
+            readiness=readiness,
+            journal=Journal(started['launch'], path),
+            **options))
+    readiness.start()
+    try:
+        return _join_launches(threads)
+    finally:
+        readiness.stop()
+
+
+class LaunchThread(threading.Thread):
+    '''Runs launch() in the background. The Topology is available from
+    result() once the thread is done.
+
+    '''
+
+    def __init__(self, config, **kwargs):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._config = config
+        self._kwargs = kwargs
+        self._topology = None
+        self._error = None
+
+    def run(self):
+        try:
+            self._topology = launch(self._config, **self._kwargs)
+        except Exception as e:
+            self._error = e
+
+    def result(self, timeout=None):
+        '''Wait for the launch to finish, returning its Topology or raising
+        the error it failed with
+
+        '''
+        self.join(timeout)
+        if self.is_alive():
+            raise errors.MLConnectionError(
+                "launch did not finish within %s seconds" % timeout)
+        if self._error is not None:
+            raise self._error
+        return self._topology
+
+
+def launch_many(configs, **kwargs):
+    '''Launch each configuration in <configs> at the same time, returning a
+    list of Topology objects in the same order. Arguments are the same as
+    for launch(). If any launch fails, the ones that succeeded are torn
+    down and the first error is raised.
+
+    All launches share one progress listener, and each region is prepared
+    only once.
+
+    '''
+    region = kwargs.pop('region', "us-west-1")
+    readiness = Readiness(kwargs.pop('callback_url', None))
+    # Each configuration records its steps as a launch of its own
+    journal = kwargs.pop('journal', None)
+    regions = _shared_regions(configs, region, kwargs)
+    threads = [LaunchThread(config, region=region, regions=regions,
+                            readiness=readiness,
+                            journal=Journal(path=journal.path)
+                            if journal else None,
+                            **kwargs)
+               for config in configs]
+    readiness.start()
+    try:
+        return _join_launches(threads)
+    finally:
+        readiness.stop()
+
+
+def _shared_regions(configs, region, kwargs):
+    # Regions for launches of <configs> running at the same time, made
+    # before any of them starts so that they don't race to make their own.
+    # Takes the arguments Region needs out of <kwargs>.
+    regions = {}
+    conn = kwargs.pop('conn', None)
+    refresh_cache = kwargs.pop('refresh_cache', False)
+    if conn is not None:
+        regions[region] = Region(region, conn=conn,
+                                 refresh_cache=refresh_cache)
+    access = kwargs.pop('access', None)
+    secret = kwargs.pop('secret', None)
+    for config in configs:
+        get_regions(config, region, regions, access=access, secret=secret,
+                    refresh_cache=refresh_cache)
+    return regions
+
+
+def _join_launches(threads):
+    for thread in threads:
+        thread.start()
+    topologies = []
+    error = None
+    for thread in threads:
+        try:
+            topologies.append(thread.result())
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        for topology in topologies:
+            topology.teardown()
+        raise error
+    return topologies
+
+
+def launch_fleet(config, copies, **kwargs):
+    '''Launch <copies> copies of <config> at once, returning a list of
+    Topology objects. Arguments are the same as for launch().
+
+    Each region is prepared only once, and all copies share the same
+    EC2Connections, metadata caches and instance status requests.
+
+    '''
+    region = kwargs.pop('region', "us-west-1")
+    readiness = Readiness(kwargs.pop('callback_url', None))
+    # Each copy records its steps as a launch of its own
+    journal = kwargs.pop('journal', None)
+    regions = _shared_regions([config], region, kwargs)
+
+    start_port = kwargs.pop('start_port', 27017)
+    tags = kwargs.pop('tags', None) or {}
+    # Only processes on shared hosts need their own ports
+    stride = ports_needed(config) if config.get('hosts') else 0
+    threads = []
+    for i in range(copies):
+        copy_tags = dict(tags)
+        copy_tags['mongolaunch-copy'] = str(i)
+        threads.append(LaunchThread(
+            copy_config(config, i, stride),
+            region=region,
+            regions=regions,
+            readiness=readiness,
+            start_port=start_port + i * stride,
+            tags=copy_tags,
+            journal=Journal(path=journal.path) if journal else None,
+            **kwargs))
+    readiness.start()
+    try:
+        return _join_launches(threads)
+    finally:
+        readiness.stop()
 
 
 if __name__ == '__main__':
@@ -1,20 +1,72 @@
 import datetime
 import getpass
+import os
+import os.path
 import socket
+import tempfile
+import threading
 import time
 
-from fabric.api import env
-from fabric.tasks import execute
-from fabric.operations import sudo
 from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from pymongo.errors import ConnectionFailure, OperationFailure
 from mongolaunch import errors, settings
-from mongolaunch.shellscript import get_script
+from mongolaunch.parallel import run_parallel
+from mongolaunch.shellscript import (
+    bootstrap_script,
+    get_script,
+    process_command,
+    user_data
+)
 
 
-# Raise an Exception on connection failures,
-# instead of printing stuff everywhere and exiting
-env.skip_bad_hosts = True
+_fabric_ready = False
+_fabric_lock = threading.Lock()
+
+
+def fabric_api():
+    '''Return fabric.api, importing and setting it up the first time. Fabric
+    is slow to import, and only hosts reached over SSH need it.
+
+    '''
+    global _fabric_ready
+    import fabric.api
+    with _fabric_lock:
+        if not _fabric_ready:
+            # Raise an Exception on connection failures,
+            # instead of printing stuff everywhere and exiting
+            fabric.api.env.skip_bad_hosts = True
+            fabric.api.env.abort_exception = errors.MLConnectionError
+            _fabric_ready = True
+    return fabric.api
+
+
+# Fabric keeps the host it is working on in a process-wide env, so only one
+# thread at a time may run fabric tasks
+_ssh_lock = threading.RLock()
+
+
+def fabric_execute(task, *args, **kwargs):
+    '''Call fabric.api.execute with <task> and the rest of the arguments,
+    once no other thread is using fabric
+
+    '''
+    fab = fabric_api()
+    with _ssh_lock:
+        return fab.execute(task, *args, **kwargs)
+
+
+def run_on_hosts(hosts, command):
+    '''Run a shell command as root on all of <hosts> at once, each in its
+    own fabric process. Returns a mapping of each Host to its output.
+
+    '''
+    fab = fabric_api()
+    by_string = dict((host._host_string(), host) for host in hosts)
+    if not by_string:
+        return {}
+    outputs = fabric_execute(fab.parallel(fab.sudo), command,
+                             hosts=list(by_string))
+    return dict((by_string[s], output) for s, output in outputs.items())
 
 
 class Host(object):
@@ -23,10 +75,20 @@ class Host(object):
 
     '''
 
+    # Kind of snapshot this host can restore before starting mongo processes
+    seed_kind = 'archive'
+
     def __init__(self, id):
         self.id = id
         # This is the plural of 'mongo'
         self.mongoes = []
+        # mongolaunch.readiness.Readiness that hears from bootstrap scripts
+        self.readiness = None
+        # mongolaunch.journal.Journal recording completed steps
+        self.journal = None
+        # How mongo processes on other hosts reach this one: "public",
+        # "private" or "auto" (see resolve_addressing())
+        self.addressing = "auto"
 
     def add_mongo(self, mongo):
         '''Add a Mongod or Mongos to be run on this Host'''
@@ -61,12 +123,122 @@ class Host(object):
     def hostname(self):
         raise NotImplementedError
 
+    def private_address(self):
+        '''Return the address hosts on the same network reach this one at'''
+        return self.hostname()
+
+    def network(self):
+        '''Return an identifier of the private network this host is on, or
+        None. Hosts on the same network can reach each other's
+        private_address(). This only depends on the configuration, so it
+        is known before the host is started.
+
+        '''
+        return None
+
     def running(self):
         raise NotImplementedError
 
     def wait_for_running(self):
         raise NotImplementedError
 
+    def terminate(self):
+        '''Stops everything that was started on this host'''
+        for mongo in self.mongoes:
+            mongo.stop()
+
+    def to_manifest(self):
+        '''Return a JSON-compatible description of this host that is enough
+        to attach to it again
+
+        '''
+        raise NotImplementedError
+
+    def run(self, command):
+        '''Run a shell command on the host as root, returning its output'''
+        raise NotImplementedError
+
+    def _host_string(self):
+        '''Return the user@host:port fabric reaches this host at'''
+        raise NotImplementedError
+
+    def get(self, remote_path, local_path):
+        '''Copy a file from the host to the machine running mongolaunch'''
+        raise NotImplementedError
+
+    def put(self, local_path, remote_path):
+        '''Copy a file from the machine running mongolaunch to the host'''
+        raise NotImplementedError
+
+    def snapshot_dbpath(self, mongo, kind, archive=None):
+        '''Capture the dbpath of <mongo>, which must run on this host and
+        be locked against writes. <kind> is the kind of snapshot the restoring
+        host understands: "ebs" or "archive". Archives are written to the
+        path <archive> on this host, or a temporary file.
+
+        Returns a tuple that can be passed to restore_dbpath
+        '''
+        if kind != 'archive':
+            raise errors.MLConfigurationError(
+                "%s can't take a snapshot of kind %s" % (self, kind))
+        if archive is None:
+            archive = "/tmp/mongolaunch-seed-%d.tgz" % mongo.port
+        self.run("mkdir -p $(dirname %s) && tar czf %s -C %s ." % (
+            archive, archive, mongo.config['dbpath']))
+        return ('archive', self, archive)
+
+    def restore_dbpath(self, mongo, snapshot):
+        '''Make the data captured in <snapshot> the dbpath of <mongo>. This
+        must happen before the host is initialized.
+
+        '''
+        if snapshot[0] != 'archive':
+            raise errors.MLConfigurationError(
+                "%s can't restore a snapshot of kind %s" % (self, snapshot[0]))
+        _, source, archive = snapshot
+        dbpath = mongo.config['dbpath']
+        if source is self:
+            # Keep the archive, it may be restored again later
+            self.run("mkdir -p %s && tar xzf %s -C %s && rm -f %s/mongod.lock"
+                     % (dbpath, archive, dbpath, dbpath))
+            return
+        fd, local_archive = tempfile.mkstemp(suffix=".tgz")
+        os.close(fd)
+        try:
+            source.get(archive, local_archive)
+            self.put(local_archive, archive)
+        finally:
+            os.remove(local_archive)
+        source.run("rm -f %s" % archive)
+        self.run("mkdir -p %s && tar xzf %s -C %s && rm -f %s/mongod.lock %s"
+                 % (dbpath, archive, dbpath, dbpath, archive))
+
+    def _notify_url(self):
+        '''URL that install scripts on this host report progress to'''
+        if self.readiness is None:
+            return ""
+        return self.readiness.notify_url(self)
+
+    def _script_context(self, mongo):
+        '''Values to fill in the install script for <mongo> with'''
+        context = dict(mongo.config)
+        context['port'] = str(mongo.port)
+        context['notify_url'] = self._notify_url()
+        if isinstance(mongo, Mongos):
+            # The host may be set up for another of its processes before
+            # Mongos.start() runs
+            context['configdb'] = mongo.configdb_string()
+        return context
+
+    def _seed_mongoes(self):
+        '''Restore the data of every mongo on this host that is restored
+        from a snapshot
+
+        '''
+        for mongo in self.mongoes:
+            if getattr(mongo, 'restore_from', None) is not None:
+                self.restore_dbpath(mongo, mongo.restore_from)
+
 
 class OwnMachine(Host):
     '''Class for machines not in EC2'''
@@ -77,10 +249,10 @@ class OwnMachine(Host):
         self._passwd = passwd
         self._is_windows = windows
         self._initialized = False
-        self._host_string = '%s@%s:22' % (self._user, self.hostname())
+        self._ssh_host = '%s@%s:22' % (self._user, self.hostname())
 
         # append to fabric environment
-        env.passwords[self._host_string] = self._passwd
+        fabric_api().env.passwords[self._ssh_host] = self._passwd
 
         Host.__init__(self, id)
 
@@ -88,34 +260,75 @@ class OwnMachine(Host):
         return self._is_windows
 
     def _get_bootstrap_script(self):
-        script = []
-        for mongo in self.mongoes:
-            # not worrying about windows, since we assume SSH capacity
-            install = get_script("install-mongodb", mongo.config)
-            script.append(install)
-        # Not worrying about \r\n versus \n here, see above comment
-        return "\n".join(script)
+        # not worrying about windows, since we assume SSH capacity
+        return bootstrap_script(
+            [self._script_context(mongo) for mongo in self.mongoes],
+            notify_url=self._notify_url())
 
     def initialize(self):
-        def _initialize():
-            sudo(self._get_bootstrap_script())
+        fab = fabric_api()
+
         if not self._initialized:
-            execute(_initialize, hosts=[self._host_string])
+            self._seed_mongoes()
+            # Rendering may start config servers on other hosts, which
+            # can't happen while fabric is busy with this one
+            script = self._get_bootstrap_script()
+
+            def _initialize():
+                return fab.sudo(script)
+            output = fabric_execute(
+                _initialize, hosts=[self._ssh_host])[self._ssh_host]
+            if self.readiness is not None:
+                self.readiness.parse_output(self.id, output)
+            if self.journal is not None:
+                self.journal.record("host_initialized", host=self.id)
             self._initialized = True
         return self._initialized
 
     def hostname(self):
         return self._address
 
+    def attach(self):
+        '''Use this machine as it is, without running install scripts'''
+        self._initialized = True
+
+    def to_manifest(self):
+        return {
+            "type": "host",
+            "hostname": self._address,
+            "user": self._user,
+            "password": self._passwd,
+            "windows": self._is_windows
+        }
+
+    def _host_string(self):
+        return self._ssh_host
+
+    def run(self, command):
+        fab = fabric_api()
+        return fabric_execute(fab.sudo, command,
+                              hosts=[self._ssh_host])[self._ssh_host]
+
+    def get(self, remote_path, local_path):
+        fab = fabric_api()
+        fabric_execute(fab.get, remote_path, local_path,
+                       hosts=[self._ssh_host])
+
+    def put(self, local_path, remote_path):
+        fab = fabric_api()
+        fabric_execute(fab.put, local_path, remote_path, use_sudo=True,
+                       hosts=[self._ssh_host])
+
     def running(self):
         if not self._initialized:
             return False
+        fab = fabric_api()
 
         def try_connect():
-            sudo("touch .hello")
-            sudo("rm .hello")
+            fab.sudo("touch .hello")
+            fab.sudo("rm .hello")
         try:
-            execute(try_connect, hosts=[self._host_string])
+            fabric_execute(try_connect, hosts=[self._ssh_host])
             return True
         except:
             return False
@@ -142,28 +355,212 @@ class OwnMachine(Host):
         return str(self)
 
 
+class InstanceTracker(object):
+    '''Looks up the state of many EC2 instances with a single request, so
+    that waiting on lots of Instances at once doesn't mean lots of requests.
+
+    '''
+
+    def __init__(self, conn, max_age=1.0):
+        self._conn = conn
+        self._max_age = max_age
+        self._ids = set()
+        self._instances = {}
+        self._updated = 0
+        self._lock = threading.Lock()
+
+    def track(self, instance_id):
+        with self._lock:
+            self._ids.add(instance_id)
+
+    def get(self, instance_id):
+        '''Return a boto.Instance for <instance_id> that is no older than
+        max_age seconds, or None if EC2 didn't know about it then. All
+        tracked instances are looked up at most once every max_age seconds,
+        however many are still missing.
+
+        '''
+        # boto is only imported by the commands that talk to EC2
+        from boto.exception import EC2ResponseError
+        with self._lock:
+            if time.time() - self._updated > self._max_age:
+                try:
+                    reservations = self._conn.get_all_instances(
+                        instance_ids=list(self._ids))
+                except EC2ResponseError:
+                    # Instances that were just launched may not be visible
+                    # yet. Try again next time.
+                    reservations = []
+                for reservation in reservations:
+                    for inst in reservation.instances:
+                        self._instances[inst.id] = inst
+                self._updated = time.time()
+            return self._instances.get(instance_id)
+
+
 class Instance(Host):
 
-    def __init__(self, id, conn, ami, keypair, group, instance_type):
+    seed_kind = 'ebs'
+
+    def __init__(self, id, conn, ami, keypair, group, instance_type,
+                 user="ec2-user", windows=None, tags=None, tracker=None,
+                 zone=None, key_file=None):
         '''Wrap a boto.Instance in a mongolaunch.models.Instance.
 
         id              the id given in the JSON config file
-        conn            the EC2Connection
+        conn            the EC2Connection for the region to launch in
+        user            the user to SSH in as
+        windows         whether the AMI is Windows. Looked up if not given.
+        tags            additional tags for the EC2 instance
+        tracker         InstanceTracker shared with other Instances
+        zone            availability zone. Chosen by EC2 if not given.
+        key_file        private key for <keypair>. Defaults to
+                        <keypair>.pem in settings.ML_PATH
 
         '''
         self._conn = conn
-        self._ami = ami
-        self._is_windows = self._conn.get_image(self._ami).platform == 'windows'
+        self.zone = zone
         self._keypair = keypair
+        self._key_file = key_file or os.path.join(settings.ML_PATH,
+                                                  "%s.pem" % keypair)
+        self._ami = ami
+        if windows is None:
+            windows = self._conn.get_image(self._ami).platform == 'windows'
+        self._is_windows = windows
+        self._tags = tags or {}
+        self._tracker = tracker or InstanceTracker(conn)
         self._group = group
         self._initialized = False
         self._type = instance_type
         self._instance_id = None
+        self._user = user
+        # device name -> (snapshot id, mongo) to restore dbpaths from
+        self._seed_volumes = {}
         Host.__init__(self, id)
 
     def is_windows(self):
         return self._is_windows
 
+    @property
+    def region(self):
+        '''Name of the EC2 region of this Instance'''
+        return self._conn.region.name
+
+    def can_initialize_early(self):
+        '''Returns True if this Instance can be started before any other
+        host, i.e. nothing in its bootstrap script depends on another host
+
+        '''
+        return bool(self.mongoes) and all(
+            not isinstance(m, Mongos) for m in self.mongoes)
+
+    @property
+    def instance_id(self):
+        '''The EC2 id of this Instance, or None if it was never started'''
+        return self._instance_id
+
+    def terminate(self):
+        if self._instance_id is not None:
+            self._conn.terminate_instances([self._instance_id])
+            if self.journal is not None:
+                self.journal.record("instance_terminated", host=self.id,
+                                    instance_id=self._instance_id,
+                                    region=self.region)
+
+    def attach(self, instance_id):
+        '''Use the EC2 instance <instance_id>, which is already running,
+        instead of launching a new one
+
+        '''
+        self._instance_id = instance_id
+        self._tracker.track(instance_id)
+        self._initialized = True
+
+    def to_manifest(self):
+        return {
+            "type": "instance",
+            "hostname": self.hostname(),
+            "windows": self._is_windows,
+            "instance_id": self._instance_id,
+            "region": self.region,
+            "zone": self.zone,
+            "ami": self._ami,
+            "instance_type": self._type,
+            "keypair": self._keypair,
+            "key_file": self._key_file,
+            "user": self._user
+        }
+
+    def _host_string(self):
+        env = fabric_api().env
+        with _ssh_lock:
+            if self._key_file not in (env.key_filename or []):
+                env.key_filename = (list(env.key_filename or []) +
+                                    [self._key_file])
+        return "%s@%s:22" % (self._user, self.hostname())
+
+    def run(self, command):
+        if self._is_windows:
+            raise errors.MLConfigurationError(
+                "can't run shell commands on Windows instance %s" % self)
+        fab = fabric_api()
+        host_string = self._host_string()
+        return fabric_execute(fab.sudo, command,
+                              hosts=[host_string])[host_string]
+
+    def get(self, remote_path, local_path):
+        fab = fabric_api()
+        fabric_execute(fab.get, remote_path, local_path,
+                       hosts=[self._host_string()])
+
+    def put(self, local_path, remote_path):
+        fab = fabric_api()
+        fabric_execute(fab.put, local_path, remote_path, use_sudo=True,
+                       hosts=[self._host_string()])
+
+    def console_output(self):
+        '''Return what the instance has written to its console so far'''
+        if self._instance_id is None:
+            return ""
+        return self._conn.get_console_output(self._instance_id).output or ""
+
+    def root_volume_id(self):
+        inst = self.boto_instance()
+        return inst.block_device_mapping[inst.root_device_name].volume_id
+
+    def snapshot_dbpath(self, mongo, kind, archive=None):
+        if kind != 'ebs':
+            return Host.snapshot_dbpath(self, mongo, kind, archive)
+        snapshot = self._conn.create_snapshot(
+            self.root_volume_id(),
+            "mongolaunch: dbpath of %s for %s" % (mongo.config['_id'],
+                                                   self.id))
+        return ('ebs', snapshot.id, mongo.config['dbpath'])
+
+    def restore_dbpath(self, mongo, snapshot):
+        if snapshot[0] == 'archive' and self._initialized:
+            # Too late to attach a volume at boot
+            return Host.restore_dbpath(self, mongo, snapshot)
+        if snapshot[0] != 'ebs':
+            raise errors.MLConfigurationError(
+                "%s can only be seeded from EBS snapshots before it starts"
+                % self)
+        if self._is_windows:
+            raise errors.MLConfigurationError(
+                "can't seed members on Windows instance %s" % self)
+        _, snapshot_id, source_dbpath = snapshot
+        wait_for_snapshot(self._conn, snapshot_id)
+        for device, seed_snapshot in self._seed_volumes.items():
+            if seed_snapshot == snapshot_id:
+                # Mongoes on the same instance share one copy of its volume
+                break
+        else:
+            # /dev/sdf through /dev/sdp are recommended for EBS volumes
+            device = "/dev/sd%s" % "fghijklmnop"[len(self._seed_volumes)]
+        mongo.config['seed_device'] = device
+        mongo.config['seed_dbpath'] = source_dbpath
+        self._seed_volumes[device] = snapshot_id
+
     def _get_bootstrap_script(self):
         '''Helper method that provides the bootstrap script for the Instance'''
         script = []
@@ -177,54 +574,76 @@ class Instance(Host):
             elif isinstance(mongo, Mongod):
                 mongoD.append(mongo)
 
-        # Check if configs are on same host as mongos. If so, use 'localhost' as
-        # hostname for config servers, instead of external hostname
-        for m in mongoS:
-            use_localhost = False
-            for cdb in m.configdbs:
-                if cdb.host == m.host:
-                    use_localhost = True
-                    break
-            if use_localhost:
-                # Adjust --configdb on Mongos
-                m.config['configdb'] = ",".join("localhost:%d" % cdb.port
-                                                for cdb in m.configdbs)
-
-        # Get scripts for mongod (potentally config servers) first, then mongos
-        for mongo in mongoD + mongoS:
-            bootstrap = get_script("install-mongodb",
-                                   mongo.config,
-                                   windows=self._is_windows)
-            script.append(bootstrap)
-
         if self._is_windows:
+            # Get scripts for mongod (potentally config servers) first, then
+            # mongos
+            for mongo in mongoD + mongoS:
+                script.append(get_script("install-mongodb",
+                                         self._script_context(mongo),
+                                         windows=True))
             script_text = ("<powershell>\r\n%s\r\n</powershell>"
                            % "\r\n".join(script))
         else:
-            script_text = "\n".join(script)
+            seeds = []
+            for mongo in mongoD:
+                if 'seed_device' in mongo.config:
+                    device = mongo.config['seed_device']
+                    seeds.append(get_script("seed-dbpath", {
+                        "device": device,
+                        "xvd_device": device.replace("/dev/sd", "/dev/xvd"),
+                        "seed_dbpath": mongo.config['seed_dbpath'],
+                        "dbpath": mongo.config['dbpath'],
+                        "port": str(mongo.port),
+                        "timeout": str(settings.SEED_DEVICE_TIMEOUT)
+                    }))
+            script_text = bootstrap_script(
+                [self._script_context(m) for m in mongoD + mongoS],
+                notify_url=self._notify_url(),
+                seeds=seeds)
         # DEBUG
         print(script_text)
         return script_text
 
     def initialize(self):
         if not self._initialized:
+            self._seed_mongoes()
+            block_devices = None
+            if self._seed_volumes:
+                from boto.ec2.blockdevicemapping import (
+                    BlockDeviceMapping, BlockDeviceType)
+                block_devices = BlockDeviceMapping()
+                for device, snapshot_id in self._seed_volumes.items():
+                    block_devices[device] = BlockDeviceType(
+                        snapshot_id=snapshot_id, delete_on_termination=True)
             reservation = self._conn.run_instances(
                 image_id=self._ami,
                 key_name=self._keypair,
                 security_groups=[self._group],
                 instance_type=self._type,
-                user_data=self._get_bootstrap_script()
+                user_data=user_data(self._get_bootstrap_script(),
+                                    windows=self._is_windows),
+                block_device_map=block_devices,
+                placement=self.zone
             )
             inst = reservation.instances[0]
-            inst.add_tag('expire-on',
-                         (datetime.datetime.now() +
-                          datetime.timedelta(days=7)).strftime("%Y-%m-%d"))
-            inst.add_tag('owner', '%s@%s' % (getpass.getuser(),
-                                             socket.gethostname()))
-            inst.add_tag('name', self.id)
-            inst.add_tag('source', 'mongolaunch')
+            tags = {
+                'expire-on': (datetime.datetime.now() +
+                              datetime.timedelta(days=7)).strftime("%Y-%m-%d"),
+                'owner': '%s@%s' % (getpass.getuser(), socket.gethostname()),
+                'name': self.id,
+                'source': 'mongolaunch'
+            }
+            tags.update(self._tags)
+            self._tracker.track(inst.id)
             self._instance_id = inst.id
             self._initialized = True
+            # Record the instance before anything else can fail, so that
+            # terminate knows about it
+            if self.journal is not None:
+                self.journal.record("instance_launched", host=self.id,
+                                    instance_id=inst.id, region=self.region)
+            # One request for all tags
+            self._conn.create_tags([inst.id], tags)
             return inst
 
     def boto_instance(self):
@@ -235,10 +654,7 @@ class Instance(Host):
         if self._initialized:
             # boto doesn't update Instances in-place, so need to request new one
             # each time
-            for reservation in self._conn.get_all_instances():
-                for inst in reservation.instances:
-                    if inst.id == self._instance_id:
-                        return inst
+            return self._tracker.get(self._instance_id)
         return None
 
     def hostname(self):
@@ -247,14 +663,27 @@ class Instance(Host):
 
         '''
         if self._initialized:
-            return self.boto_instance().dns_name
+            inst = self.boto_instance()
+            return inst.dns_name if inst is not None else ""
         return None
 
+    def private_address(self):
+        '''Returns the private IP address of this Instance'''
+        inst = self.boto_instance()
+        return inst.private_ip_address if inst is not None else None
+
+    def network(self):
+        # Instances are launched by security group name, so all of them in
+        # a region land in its default VPC (or EC2-Classic) together
+        return ("region", self.region)
+
     def running(self):
         '''Returns True when this Instance is running and has a DNS name'''
         if not self._initialized:
             return None
-        return self.boto_instance().state == 'running' and bool(self.hostname())
+        inst = self.boto_instance()
+        return (inst is not None and inst.state == 'running' and
+                bool(inst.dns_name))
 
     def wait_for_running(self):
         counter = 0
@@ -312,6 +741,8 @@ class Mongod(MongoProcess):
     def __init__(self, config=None, port=27017):
         self.port = port
         self.config = config
+        # Snapshot (see Host.snapshot_dbpath) to restore before starting
+        self.restore_from = None
         # Adjust port in command-line options, if not present
         options = config.get("options", "")
         if not "--port" in options:
@@ -328,15 +759,20 @@ class Mongod(MongoProcess):
         '''Returns True when this mongo process can accept connections'''
         if not self.host.running():
             return False
-        try:
-            MongoClient(self.host.hostname(), port=self.port)
-            return True
-        except ConnectionFailure:
-            return False
+        # MongoClient connects lazily, so ask the server something
+        return self.is_master() is not None
 
     def wait_for_available(self):
         counter = 0
         while not self.available():
+            if self.host.readiness is not None:
+                # The bootstrap script may have said why it won't come up
+                state = self.host.readiness.check(self.host, self.port)
+                if state is not None and state[0] == 'failed':
+                    raise errors.MLConnectionError(
+                        "%s failed to start on %s:%d. Abandoning setup.\n%s"
+                        % (self.config.get('bin', 'mongod'), str(self.host),
+                           self.port, state[1]))
             print("waiting for MongoDB to become "
                   "available on host %s:%d... %d" % (
                       str(self.host), self.port, counter
@@ -352,28 +788,103 @@ class Mongod(MongoProcess):
     def start(self):
         self.host.initialize()
         self.wait_for_available()
+        if self.host.journal is not None:
+            self.host.journal.record("process_started",
+                                     mongo=self.config['_id'],
+                                     host=self.host.id, port=self.port)
+
+    def stop(self):
+        client = MongoClient(self.host.hostname(), port=self.port)
+        try:
+            client.admin.command("shutdown", force=True)
+        except ConnectionFailure:
+            # The server closes the connection as it shuts down
+            pass
+        finally:
+            client.close()
+
+    def is_master(self):
+        '''Return the reply of isMaster, or None if this process can't be
+        reached
+
+        '''
+        client = MongoClient(self.host.hostname(), port=self.port,
+                             serverSelectionTimeoutMS=2000)
+        try:
+            return client.admin.command("isMaster")
+        except ConnectionFailure:
+            return None
+        finally:
+            client.close()
+
+    def kill(self):
+        '''Kill this process with SIGKILL, without letting it shut down'''
+        self.host.run("pkill -9 -f -- '--port %d( |$)'" % self.port)
+
+    def restart(self, version=None):
+        '''Start this process again after stop() or kill(), with the same
+        dbpath and options. <version> switches it to other binaries, which
+        must be under /opt/mongolaunch on the host already.
+
+        '''
+        if self.host.is_windows():
+            raise errors.MLConfigurationError(
+                "can't restart %s on Windows host %s" % (self.config['_id'],
+                                                         self.host))
+        if version is not None:
+            self.config['version'] = version
+        # The dbpath stays locked until the old process is gone. This runs
+        # on its own, since the command line that starts the process would
+        # match the pattern too.
+        output = self.host.run(
+            "for i in $(seq %d); do pgrep -f -- '--port %d( |$)' > /dev/null "
+            "|| exit 0; sleep 1; done; echo still running" % (
+                settings.MAX_MONGO_TRIES, self.port))
+        if "still running" in output:
+            raise errors.MLConnectionError(
+                "%s on %s did not exit within %d seconds" % (
+                    self.config['_id'], self.host, settings.MAX_MONGO_TRIES))
+        # --fork only returns once the process is ready for connections
+        self.host.run("%s --fork" % process_command(
+            self.host._script_context(self)))
 
 
 class Mongos(Mongod):
 
-    def __init__(self, config, configdbs, port=27017):
+    def __init__(self, config, configdbs, port=27017, configdb=None):
+        '''<configdb> is the --configdb string, if the config servers are
+        running already. Otherwise it is worked out by configdb_string().
+
+        '''
         self.configdbs = configdbs
+        self._configdb = configdb
         Mongod.__init__(self, config, port=port)
 
     def available(self):
         return (all(conf.available() for conf in self.configdbs) and
                 Mongod.available(self))
 
+    def configdb_string(self):
+        '''Return the --configdb string of this mongos. Config servers on
+        other hosts are started first, since their addresses are only known
+        once they run, and mongos won't start without reaching them.
+
+        '''
+        if self._configdb is None:
+            for configdb in self.configdbs:
+                if configdb.host is not self.host:
+                    configdb.start()
+            self._configdb = ",".join(addresses(self.configdbs,
+                                                among=[self]))
+            self.config['configdb'] = self._configdb
+        return self._configdb
+
     def start(self):
         for configdb in self.configdbs:
             print("Starting configdb on port %d" % configdb.port)
             print(configdb.config)
             configdb.start()
-        # Get --configdb string
-        config_string = ",".join("%s:%d" % (c.host.hostname(),
-                                            c.port) for c in self.configdbs)
-        print("config_string: %s" % config_string)
-        self.config['configdb'] = config_string
+        print("config_string: %s" % self.configdb_string())
         Mongod.start(self)
 
     def __str__(self):
@@ -386,12 +897,19 @@ class Mongos(Mongod):
 class Cluster(Mongo):
     '''Base class for MongoDB cluster models'''
 
+    # mongolaunch.journal.Journal recording completed steps
+    journal = None
+
     def __init__(self):
         self._initialized = False
 
     def available(self):
         return self._initialized
 
+    def attach(self):
+        '''Treat this cluster as already configured'''
+        self._initialized = True
+
     def wait_for_available(self):
         if not self.available():
             return self.start()
@@ -404,35 +922,165 @@ class ReplicaSet(Cluster):
         self.members = members
         self.config = config
         self.name = self.config['name']
+        # Processes outside the set that connect to its members
+        self.peers = []
+        # "host:port" of each member in the replica set configuration
+        self.hosts = None
         self._initialized = False
 
     def start(self):
         if not self._initialized:
             for memb in self.members:
                 memb.start()
+            memb = self.members[0]
 
-            # Use "localhost" as hostname if all members are on the same host
-            use_localhost = False
-            if all((m.host == memb.host) for m in self.members):
-                use_localhost = True
-
-            def host(m):
-                if use_localhost:
-                    return "localhost"
-                else:
-                    return m.host.hostname()
             client = MongoClient(memb.host.hostname(), port=memb.port)
-            hosts = ["%s:%d" % (host(memb),
-                                memb.port) for memb in self.members]
-            member_list = [{"_id": i, "host": h} for i, h in enumerate(hosts)]
-            client.admin.command("replSetInitiate", {
-                "_id": self.name,
-                "members": member_list
-            })
+            hosts = addresses(self.members, among=self.peers)
+            # replSetGetConfig only exists from MongoDB 3.0
+            current = client.local.system.replset.find_one()
+            if current is None:
+                member_list = [{"_id": i, "host": h}
+                               for i, h in enumerate(hosts)]
+                client.admin.command("replSetInitiate", {
+                    "_id": self.name,
+                    "members": member_list
+                })
+            else:
+                old = sorted(current['members'], key=lambda m: m['_id'])
+                if len(old) != len(hosts) or \
+                        any(m.restore_from is None for m in self.members):
+                    client.close()
+                    raise errors.MLConfigurationError(
+                        "replica set %s was configured already, and not by "
+                        "the snapshot its members were restored from"
+                        % self.name)
+                # Members were restored from a snapshot of this set. Point
+                # its configuration at wherever they run now, if that moved.
+                if [m['host'] for m in old] != hosts:
+                    for m, h in zip(old, hosts):
+                        m['host'] = h
+                    current['version'] += 1
+                    client.admin.command("replSetReconfig", current,
+                                         force=True)
             client.close()
+            self.hosts = hosts
+            if self.journal is not None:
+                self.journal.record("set_initiated", set=self.config['_id'])
             self._initialized = True
         return self._initialized
 
+    def seed_hosts(self):
+        '''Return the "host:port" of each member as the replica set
+        configuration has it, which is what addShard has to be given
+
+        '''
+        if self.hosts is None:
+            # Configured by an earlier launch
+            memb = self.members[0]
+            client = MongoClient(memb.host.hostname(), port=memb.port)
+            try:
+                current = client.local.system.replset.find_one()
+            finally:
+                client.close()
+            self.hosts = [m['host'] for m in
+                          sorted(current['members'], key=lambda m: m['_id'])]
+        return self.hosts
+
+    def add_member(self, mongo, source=None):
+        '''Add <mongo>, a Mongod that is not running yet on a running Linux
+        host, to this replica set while the set is running. The dbpath of
+        <source>, a member (the primary if not given), is copied to <mongo>
+        first, with writes to <source> blocked meanwhile, so that <mongo>
+        only has to catch up on the oplog instead of running an initial
+        sync.
+
+        '''
+        if mongo.host.is_windows():
+            raise errors.MLConfigurationError(
+                "can't add members on Windows host %s" % mongo.host)
+        self._wait(lambda: self.primary() is not None, "a primary")
+        source = source or self.primary()
+        print("Seeding %s from %s" % (mongo.config['_id'],
+                                      source.config['_id']))
+        client = MongoClient(source.host.hostname(), port=source.port)
+        # Block writes so that the dbpath is consistent on disk
+        fsync_lock(client)
+        try:
+            snapshot = source.host.snapshot_dbpath(source, 'archive')
+        finally:
+            fsync_unlock(client)
+            client.close()
+        mongo.host.restore_dbpath(mongo, snapshot)
+        mongo.restart()
+
+        host = addresses([mongo], among=self.members + self.peers)[0]
+        self._wait(lambda: self.primary() is not None, "a primary")
+        primary = self.primary()
+        client = MongoClient(primary.host.hostname(), port=primary.port)
+        try:
+            current = client.local.system.replset.find_one()
+            client.admin.command("replSetReconfig",
+                                 with_member(current, host))
+        finally:
+            client.close()
+        self.members.append(mongo)
+        if self.hosts is not None:
+            self.hosts.append(host)
+        self._wait(lambda: (mongo.is_master() or {}).get("secondary"),
+                   "%s to catch up" % mongo.config['_id'])
+
+    def primary(self):
+        '''Return the member that is primary, or None'''
+        for memb in self.members:
+            if (memb.is_master() or {}).get("ismaster"):
+                return memb
+        return None
+
+    def _wait(self, condition, description):
+        counter = 0
+        while not condition():
+            print("waiting for %s in replica set %s... %d" % (
+                description, self.name, counter))
+            counter += 1
+            if counter > settings.MAX_MONGO_TRIES:
+                raise errors.MLConnectionError(
+                    "Replica set %s did not recover in a reasonable amount "
+                    "of time." % self.name)
+            time.sleep(1)
+
+    def _restart_member(self, memb, version):
+        memb.stop()
+        memb.restart(version)
+        self._wait(lambda: (memb.is_master() or {}).get("secondary"),
+                   "%s to rejoin" % memb.config['_id'])
+
+    def restart(self, version=None):
+        '''Restart every member one at a time, so the set keeps a primary
+        most of the time: secondaries first, then the primary once it has
+        stepped down. <version> switches members to other binaries (see
+        Mongod.restart).
+
+        '''
+        if len(self.members) == 1:
+            memb = self.members[0]
+            memb.stop()
+            memb.restart(version)
+            self._wait(lambda: self.primary() is memb, "a primary")
+            return
+        self._wait(lambda: self.primary() is not None, "a primary")
+        primary = self.primary()
+        for memb in self.members:
+            if memb is not primary:
+                self._restart_member(memb, version)
+        client = MongoClient(primary.host.hostname(), port=primary.port)
+        try:
+            step_down(client, 60)
+        finally:
+            client.close()
+        self._wait(lambda: self.primary() not in (None, primary),
+                   "a new primary")
+        self._restart_member(primary, version)
+
     def __str__(self):
         return "<ReplicaSet %s: %s>" % (
             self.name,
@@ -448,8 +1096,18 @@ class ShardedCluster(Cluster):
     def __init__(self, mongos, shards):
         self.mongos = mongos
         self.shards = shards
+        for sh in shards:
+            if isinstance(sh, ReplicaSet):
+                sh.peers = [mongos] + mongos.configdbs
         self._initialized = False
 
+    def processes(self):
+        '''Return every mongo process in this cluster'''
+        processes = [self.mongos] + self.mongos.configdbs
+        for sh in self.shards:
+            processes.extend(getattr(sh, 'members', [sh]))
+        return processes
+
     def start(self):
         if not self._initialized:
             print("Starting Mongos!!!!")
@@ -459,31 +1117,175 @@ class ShardedCluster(Cluster):
                 sh.start()
             client = MongoClient(self.mongos.host.hostname(),
                                  port=self.mongos.port)
+            # Config servers restored from a snapshot already know about
+            # the shards, maybe under old hostnames
+            existing = dict((doc['_id'], doc['host'])
+                            for doc in client.config.shards.find())
+            standalone_ids = sorted(k for k, h in existing.items()
+                                    if "/" not in h)
+            moved = False
+            processes = self.processes()
             for sh in self.shards:
                 # Initialize shard
                 sh.start()
 
                 # Determine standalone v replica set
-                def hostname(mongo):
-                    if mongo.host == self.mongos.host:
-                        return "localhost"
-                    return mongo.host.hostname()
-
                 if isinstance(sh, ReplicaSet):
-                    sh_str = "%s/%s" % (
-                        sh.name,
-                        ",".join("%s:%d" % (hostname(m), m.port)
-                                 for m in sh.members)
-                    )
+                    # Exactly what the set was configured with, or
+                    # addShard rejects it
+                    sh_str = "%s/%s" % (sh.name, ",".join(sh.seed_hosts()))
                 elif isinstance(sh, Mongod):
-                    sh_str = "%s:%d" % (hostname(sh), sh.port)
-                client.admin.command({"addShard": sh_str})
+                    sh_str = addresses([sh], among=processes)[0]
+
+                if sh_str in existing.values():
+                    # Added already, under the address it has now
+                    standalone_ids = [k for k in standalone_ids
+                                      if existing[k] != sh_str]
+                else:
+                    shard_id = None
+                    if isinstance(sh, ReplicaSet):
+                        if sh.name in existing:
+                            shard_id = sh.name
+                    elif standalone_ids:
+                        # Standalone shards were added in the same order
+                        shard_id = standalone_ids.pop(0)
+                    if shard_id is None:
+                        client.admin.command({"addShard": sh_str})
+                    else:
+                        client.config.shards.update_one(
+                            {"_id": shard_id}, {"$set": {"host": sh_str}})
+                        moved = True
+                if self.journal is not None:
+                    self.journal.record("shard_added",
+                                        cluster=self.mongos.config['_id'],
+                                        shard=sh.config['_id'])
+            if moved:
+                client.admin.command("flushRouterConfig")
             self._initialized = True
         return self._initialized
 
+    def restart(self, version=None):
+        '''Restart every process of the cluster: the shards (all at once,
+        each replica set one member at a time), then the config servers one
+        at a time, and the mongos last. <version> switches them to other
+        binaries (see Mongod.restart).
+
+        '''
+        def restart_shard(sh):
+            if isinstance(sh, ReplicaSet):
+                sh.restart(version)
+            else:
+                sh.stop()
+                sh.restart(version)
+
+        run_parallel([lambda sh=sh: restart_shard(sh) for sh in self.shards])
+        for configdb in self.mongos.configdbs:
+            configdb.stop()
+            configdb.restart(version)
+        self.mongos.stop()
+        self.mongos.restart(version)
+
     def __str__(self):
         return "<ShardedCluster %s>" % (
             ",".join(str(sh) for sh in self.shards))
 
     def __repr__(self):
         return str(self)
+
+
+def resolve_addressing(hosts, addressing):
+    '''Turn the addressing policy <addressing> for <hosts> into "public" or
+    "private". "auto" is "private" if all hosts are on the same network.
+    Only the configuration is looked at, so the answer is the same before
+    and after the hosts are started.
+
+    '''
+    if addressing != "auto":
+        return addressing
+    networks = set(h.network() for h in hosts)
+    if None not in networks and len(networks) == 1:
+        return "private"
+    return "public"
+
+
+def addresses(mongoes, among=()):
+    '''Return the "host:port" each of <mongoes> is reached at by the others
+    and by <among>, other processes that need to reach them, for replica
+    set configurations, --configdb and addShard.
+
+    Processes all on one host use localhost, since mongod rejects
+    configurations that mix localhost with other hosts. Otherwise, private
+    addresses are used if every host's addressing resolves to "private"
+    (see resolve_addressing()). Public hostnames are used in all other
+    cases.
+
+    '''
+    hosts = set(m.host for m in list(mongoes) + list(among))
+    if len(hosts) == 1:
+        return ["localhost:%d" % m.port for m in mongoes]
+    if all(resolve_addressing(hosts, h.addressing) == "private"
+           for h in hosts):
+        return ["%s:%d" % (m.host.private_address(), m.port) for m in mongoes]
+    return ["%s:%d" % (m.host.hostname(), m.port) for m in mongoes]
+
+
+def wait_for_snapshot(conn, snapshot_id):
+    '''Wait for the EBS snapshot <snapshot_id> to complete'''
+    counter = 0
+    snapshot = conn.get_all_snapshots(snapshot_ids=[snapshot_id])[0]
+    while snapshot.status != 'completed':
+        if snapshot.status == 'error':
+            raise errors.MongoLaunchError(
+                "EBS snapshot %s failed" % snapshot_id)
+        if counter > settings.MAX_SNAPSHOT_TRIES:
+            raise errors.MLConnectionError(
+                "EBS snapshot %s did not complete in a reasonable "
+                "amount of time. Abandoning setup." % snapshot_id)
+        print("waiting for snapshot %s to complete (%s)... %d" % (
+            snapshot_id, snapshot.progress, counter))
+        counter += 1
+        time.sleep(5)
+        snapshot = conn.get_all_snapshots(snapshot_ids=[snapshot_id])[0]
+    return True
+
+
+def step_down(client, seconds, force=False):
+    '''Make the primary <client> is connected to step down, and not seek
+    election again for <seconds>. <force> steps down even if no secondary
+    has caught up.
+
+    '''
+    options = {"force": True} if force else {}
+    try:
+        client.admin.command("replSetStepDown", seconds, **options)
+    except ConnectionFailure:
+        # Before 4.2, the primary drops all connections as it steps down
+        pass
+
+
+def fsync_lock(client):
+    '''Flush the server <client> is connected to and block writes to it'''
+    client.admin.command("fsync", lock=True)
+
+
+def fsync_unlock(client):
+    '''Allow writes again after fsync_lock(client)'''
+    try:
+        client.admin.command("fsyncUnlock")
+    except OperationFailure:
+        # Before MongoDB 3.2, unlocking is a query on a special collection
+        client.admin["$cmd.sys.unlock"].find_one()
+
+
+def with_member(current, host):
+    '''Return a copy of the replica set configuration <current> with a new
+    member at <host>, ready for replSetReconfig
+
+    '''
+    config = dict(current)
+    config['members'] = list(current['members']) + [{
+        "_id": max(m['_id'] for m in current['members']) + 1,
+        "host": host
+    }]
+    config['version'] = current['version'] + 1
+    return config
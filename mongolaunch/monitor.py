@@ -0,0 +1,286 @@
+'''Collect metrics from launched mongo processes.
+
+Every process gets one long-lived connection. At each interval, serverStatus
+(and replSetGetStatus for replica set members) is polled on all processes at
+once using a small thread pool. Samples are appended to a JSON Lines file
+and/or served in the Prometheus text format on a local HTTP port.
+
+'''
+
+import json
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import pymongo
+import pymongo.errors
+
+from mongolaunch import settings
+import mongolaunch.models
+
+# Sections of serverStatus that are expensive to produce and not reported
+_EXCLUDED_SECTIONS = dict((section, 0) for section in (
+    "repl", "metrics", "locks", "tcmalloc", "wiredTiger", "recordStats"))
+
+
+class Endpoint(object):
+    '''A single mongo process to collect metrics from'''
+
+    def __init__(self, id, kind, mongo, replset=None):
+        self.id = id
+        self.kind = kind
+        self.mongo = mongo
+        self.replset = replset
+        self._client = None
+
+    @property
+    def host_id(self):
+        return self.mongo.host.id
+
+    def client(self):
+        if self._client is None:
+            self._client = pymongo.MongoClient(
+                self.mongo.host.hostname(),
+                port=self.mongo.port,
+                connect=False,
+                maxPoolSize=1,
+                serverSelectionTimeoutMS=settings.MONITOR_TIMEOUT_MS,
+                socketTimeoutMS=settings.MONITOR_TIMEOUT_MS
+            )
+        return self._client
+
+    def poll(self):
+        '''Return one sample of metrics from this process'''
+        sample = {
+            "ts": time.time(),
+            "id": self.id,
+            "kind": self.kind,
+            "host": self.host_id,
+            "address": "%s:%d" % (self.mongo.host.hostname(), self.mongo.port)
+        }
+        try:
+            admin = self.client().admin
+            sample["status"] = _status_metrics(
+                admin.command("serverStatus", **_EXCLUDED_SECTIONS))
+            if self.replset is not None:
+                sample["repl"] = _repl_metrics(
+                    admin.command("replSetGetStatus"))
+            sample["up"] = 1
+        except pymongo.errors.PyMongoError as e:
+            sample["up"] = 0
+            sample["error"] = str(e)
+        return sample
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+def _status_metrics(status):
+    mem = status.get("mem", {})
+    network = status.get("network", {})
+    queue = status.get("globalLock", {}).get("currentQueue", {})
+    return {
+        "uptime": status.get("uptime"),
+        "version": status.get("version"),
+        "opcounters": status.get("opcounters", {}),
+        "connections": status.get("connections", {}).get("current"),
+        "resident_mb": mem.get("resident"),
+        "virtual_mb": mem.get("virtual"),
+        "bytes_in": network.get("bytesIn"),
+        "bytes_out": network.get("bytesOut"),
+        "queued": queue.get("total"),
+        "page_faults": status.get("extra_info", {}).get("page_faults")
+    }
+
+
+def _repl_metrics(status):
+    members = status.get("members", [])
+    primary = [m for m in members if m.get("state") == 1]
+    me = [m for m in members if m.get("self")]
+    metrics = {"set": status.get("set"), "state": status.get("myState")}
+    if me and primary and "optimeDate" in me[0]:
+        lag = primary[0]["optimeDate"] - me[0]["optimeDate"]
+        metrics["lag_secs"] = (lag.days * 86400 + lag.seconds +
+                               lag.microseconds / 1e6)
+    return metrics
+
+
+def endpoints(mongoes, replicas):
+    '''Build the list of Endpoints for the processes in <mongoes> and their
+    config servers. <replicas> maps replica set _ids to ReplicaSet models.
+
+    '''
+    replset_of = {}
+    for rs in replicas.values():
+        for member in rs.members:
+            replset_of[id(member)] = rs.name
+    result = []
+    for mongoid, mongo in mongoes.items():
+        if isinstance(mongo, mongolaunch.models.Mongos):
+            result.append(Endpoint(mongoid, "mongos", mongo))
+            for cdb in mongo.configdbs:
+                result.append(Endpoint(cdb.config['_id'], "config", cdb))
+        else:
+            result.append(Endpoint(mongoid, "mongod", mongo,
+                                   replset=replset_of.get(id(mongo))))
+    return result
+
+
+def host_load(samples, previous):
+    '''Summarize <samples> per host. <previous> holds the opcounter totals of
+    the last call and is updated in place to compute operation rates.
+
+    '''
+    hosts = {}
+    for sample in samples:
+        load = hosts.setdefault(sample["host"], {
+            "ts": sample["ts"], "host": sample["host"], "kind": "host",
+            "processes": 0, "up": 0, "connections": 0, "resident_mb": 0,
+            "queued": 0, "ops": 0
+        })
+        load["processes"] += 1
+        if not sample["up"]:
+            continue
+        status = sample["status"]
+        load["up"] += 1
+        for field in ("connections", "resident_mb", "queued"):
+            load[field] += status.get(field) or 0
+        load["ops"] += sum(status["opcounters"].values())
+    for host_id, load in hosts.items():
+        ops, ts = load.pop("ops"), load["ts"]
+        if host_id in previous:
+            last_ops, last_ts = previous[host_id]
+            if ts > last_ts:
+                load["ops_per_sec"] = max(ops - last_ops, 0) / (ts - last_ts)
+        previous[host_id] = (ops, ts)
+    return list(hosts.values())
+
+
+def _prometheus_text(samples, hosts):
+    lines = []
+
+    def metric(name, labels, value):
+        if value is None:
+            return
+        lines.append("mongolaunch_%s{%s} %s" % (
+            name,
+            ",".join('%s="%s"' % kv for kv in sorted(labels.items())),
+            value
+        ))
+
+    for sample in samples:
+        labels = {"id": sample["id"], "kind": sample["kind"],
+                  "host": sample["host"]}
+        metric("up", labels, sample["up"])
+        if not sample["up"]:
+            continue
+        status = sample["status"]
+        for field in ("uptime", "connections", "resident_mb", "virtual_mb",
+                      "bytes_in", "bytes_out", "queued", "page_faults"):
+            metric(field, labels, status.get(field))
+        for op, count in status["opcounters"].items():
+            op_labels = dict(labels, op=op)
+            metric("opcounters_total", op_labels, count)
+        repl = sample.get("repl", {})
+        if repl:
+            repl_labels = dict(labels, set=repl["set"])
+            metric("repl_state", repl_labels, repl.get("state"))
+            metric("repl_lag_seconds", repl_labels, repl.get("lag_secs"))
+    for load in hosts:
+        labels = {"host": load["host"]}
+        for field in ("processes", "up", "connections", "resident_mb",
+                      "queued", "ops_per_sec"):
+            metric("host_%s" % field, labels, load.get(field))
+    return "\n".join(lines) + "\n"
+
+
+class Monitor(object):
+    '''Polls a list of Endpoints at a fixed interval'''
+
+    def __init__(self, endpoints, interval=settings.MONITOR_INTERVAL,
+                 jsonl_path=None, prometheus_port=None):
+        self.endpoints = endpoints
+        self.interval = interval
+        self._jsonl_path = jsonl_path
+        self._prometheus_port = prometheus_port
+        self._pool = ThreadPool(
+            max(1, min(len(endpoints), settings.MONITOR_THREADS)))
+        self._previous_ops = {}
+        self._latest = ""
+        self._stopped = threading.Event()
+
+    def collect(self):
+        '''Poll every endpoint once, returning (process samples, host
+        samples)
+
+        '''
+        samples = self._pool.map(lambda e: e.poll(), self.endpoints)
+        return samples, host_load(samples, self._previous_ops)
+
+    def _serve_prometheus(self):
+        monitor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = monitor._latest.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", self._prometheus_port), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        print("Serving Prometheus metrics on http://127.0.0.1:%d/metrics"
+              % self._prometheus_port)
+        return server
+
+    def run(self, iterations=None):
+        '''Collect metrics until interrupted, or for <iterations> intervals'''
+        server = None
+        jsonl = None
+        if self._prometheus_port is not None:
+            server = self._serve_prometheus()
+        if self._jsonl_path is not None:
+            jsonl = open(self._jsonl_path, "a")
+        count = 0
+        try:
+            while not self._stopped.is_set():
+                started = time.time()
+                samples, hosts = self.collect()
+                self._latest = _prometheus_text(samples, hosts)
+                if jsonl is not None:
+                    for sample in samples + hosts:
+                        jsonl.write(json.dumps(sample) + "\n")
+                    jsonl.flush()
+                count += 1
+                if iterations is not None and count >= iterations:
+                    break
+                self._stopped.wait(
+                    max(0, self.interval - (time.time() - started)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if server is not None:
+                server.shutdown()
+            if jsonl is not None:
+                jsonl.close()
+            self._pool.terminate()
+            for endpoint in self.endpoints:
+                endpoint.close()
+
+    def stop(self):
+        self._stopped.set()
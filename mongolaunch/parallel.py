@@ -0,0 +1,31 @@
+'''Helpers for doing several slow things at once'''
+
+from multiprocessing.pool import ThreadPool
+
+
+def run_parallel(tasks, max_threads=None):
+    '''Call every function in <tasks>, each in its own thread (at most
+    <max_threads> at a time). Returns their results in the same order, or
+    raises the first exception any of them raised.
+
+    '''
+    if not tasks:
+        return []
+
+    def call(task):
+        # ThreadPool only hands Exceptions back to the caller, and waits
+        # forever for a task that raised SystemExit or KeyboardInterrupt
+        try:
+            return True, task()
+        except BaseException as e:
+            return False, e
+
+    pool = ThreadPool(min(len(tasks), max_threads or len(tasks)))
+    try:
+        outcomes = pool.map(call, tasks)
+    finally:
+        pool.terminate()
+    for ok, value in outcomes:
+        if not ok:
+            raise value
+    return [value for _, value in outcomes]
@@ -0,0 +1,182 @@
+'''Work out what launching a configuration involves, from the configuration
+document alone. Nothing here imports boto, pymongo or fabric, or talks to
+EC2 or any host.
+
+'''
+
+import copy
+import itertools
+import os.path
+
+from mongolaunch import errors
+
+
+def _host(mongo):
+    return mongo.get("instance") or mongo.get("host")
+
+
+def check(config, key_name=None):
+    '''Raise MLConfigurationError if <config> can't be launched: it has EC2
+    instances but no <key_name> was given, or it refers to anything it
+    doesn't define
+
+    '''
+    title = config.get("configuration_title", "")
+    if config.get('instances') and key_name is None:
+        raise errors.MLConfigurationError(
+            "Configuration %s has EC2 instances, but no key was "
+            "provided. Abandoning setup." % title)
+    hosts = set(h['_id'] for h in config.get('instances', []))
+    hosts.update(h['_id'] for h in config.get('hosts', []))
+    mongoes = dict((m['_id'], m) for m in config.get('mongo', []))
+    for mongo in config.get('mongo', []):
+        host_id = _host(mongo)
+        if host_id not in hosts:
+            raise errors.MLConfigurationError(
+                "no host %s found for %s!" % (host_id, mongo['_id']))
+        # Every member of a new launch starts empty, so there is nothing to
+        # seed from yet
+        if mongo.get("seed_from") is not None:
+            raise errors.MLConfigurationError(
+                "%s can't be seeded from %s, which is launched empty along "
+                "with it. Launch without seed_from, load data, then use "
+                "mongolaunch add-member." % (mongo['_id'], mongo['seed_from']))
+    replicas = set()
+    for rs in config.get('replicas', []):
+        for member in rs['members']:
+            if member not in mongoes:
+                raise errors.MLConfigurationError(
+                    "no mongo %s found for replica set %s!" % (
+                        member, rs['_id']))
+        replicas.add(rs['_id'])
+    clusters = set()
+    for cl in config.get('clusters', []):
+        for shard in [cl['mongos']] + cl['shards']:
+            if shard not in mongoes and shard not in replicas:
+                raise errors.MLConfigurationError(
+                    "no mongo or replica set %s found for cluster %s!" % (
+                        shard, cl['_id']))
+        clusters.add(cl['_id'])
+    for entry in config.get('seed', []):
+        if entry['target'] not in mongoes and \
+                entry['target'] not in replicas and \
+                entry['target'] not in clusters:
+            raise errors.MLConfigurationError(
+                "no mongo, replica set or cluster %s found to seed!"
+                % entry['target'])
+
+
+def assign_ports(config, start_port=27017):
+    '''Return a mapping of the _id of every process in <config> to (its
+    port, the ports of its config servers). Processes without a port in
+    <config>, and config servers, get the next port from <start_port> on.
+
+    '''
+    # this is somewhat dependent on security group rules
+    available_port = itertools.count(start_port)
+    result = {}
+    for mongo in config['mongo']:
+        config_ports = []
+        if mongo['bin'].lower() == 'mongos':
+            config_ports = [next(available_port) for _ in range(
+                1 if mongo['single_configdb'] else 3)]
+        # A port is taken even when the configuration has one
+        port = mongo.get("port", next(available_port))
+        result[mongo['_id']] = (port, config_ports)
+    return result
+
+
+def configdb_hosts(config):
+    '''Return a mapping of the _id of the mongos of every cluster in <config>
+    to the _ids of the hosts of its config servers. Config servers go on
+    the host of their mongos when every shard is there too. Otherwise each
+    one gets its own EC2 instance, named after the mongos, so that each
+    cluster, and each copy of a fleet (see copy_config), gets its own.
+
+    '''
+    mongoes = dict((m['_id'], m) for m in config['mongo'])
+    replicas = dict((rs['_id'], rs) for rs in config.get('replicas', []))
+    result = {}
+    for cl in config.get('clusters', []):
+        mongos = mongoes[cl['mongos']]
+        members = []
+        for shard in cl['shards']:
+            if shard in replicas:
+                members.extend(mongoes[m] for m in replicas[shard]['members'])
+            else:
+                members.append(mongoes[shard])
+        count = 1 if mongos['single_configdb'] else 3
+        if all(_host(m) == _host(mongos) for m in members):
+            result[mongos['_id']] = [_host(mongos)] * count
+        else:
+            result[mongos['_id']] = ["%s_config%d_inst" % (mongos['_id'], i)
+                                     for i in range(count)]
+    return result
+
+
+def assignments(config, start_port=27017):
+    '''Return (_id, bin, host _id, port) for every process launching
+    <config> would start, including config servers, which are named after
+    their port
+
+    '''
+    assigned = assign_ports(config, start_port)
+    config_hosts = configdb_hosts(config)
+    result = []
+    for mongo in config['mongo']:
+        port, config_ports = assigned[mongo['_id']]
+        hosts = config_hosts.get(mongo['_id'], [None] * len(config_ports))
+        for config_port, host_id in zip(config_ports, hosts):
+            result.append(("config%d" % config_port, "mongod", host_id,
+                           config_port))
+        result.append((mongo['_id'], mongo['bin'].lower(), _host(mongo),
+                       port))
+    return result
+
+
+def ports_needed(config):
+    '''Return the number of ports a launch of <config> may take'''
+    count = 0
+    for mongo in config['mongo']:
+        count += 1
+        if mongo['bin'].lower() == 'mongos':
+            count += 1 if mongo['single_configdb'] else 3
+    return count
+
+
+def copy_config(config, index, port_stride):
+    '''Return a copy of <config> for the <index>th copy in a fleet. Every
+    _id gets a "-c<index>" suffix, so that each copy gets its own EC2
+    instances, including the config server instances named after each
+    mongos. Machines in the "hosts" section are shared by all copies,
+    so ports, dbpaths and logpaths of processes running on them are moved
+    out of each other's way.
+
+    '''
+    suffix = "-c%d" % index
+    config = copy.deepcopy(config)
+    config['configuration_title'] = "%s (copy %d)" % (
+        config.get('configuration_title', ""), index)
+    for inst in config.get('instances', []):
+        inst['_id'] += suffix
+    for mongo in config['mongo']:
+        mongo['_id'] += suffix
+        if 'instance' in mongo:
+            mongo['instance'] += suffix
+        if 'host' in mongo:
+            if 'port' in mongo:
+                mongo['port'] += index * port_stride
+            base, ext = os.path.splitext(
+                mongo.get('logpath', '/var/log/mongod.log'))
+            mongo['logpath'] = base + suffix + ext
+            mongo['dbpath'] = mongo.get('dbpath', '/data/db') + suffix
+    for rs in config.get('replicas', []):
+        rs['_id'] += suffix
+        rs['members'] = [m + suffix for m in rs['members']]
+    for cl in config.get('clusters', []):
+        cl['_id'] += suffix
+        cl['mongos'] += suffix
+        cl['shards'] = [sh + suffix for sh in cl['shards']]
+    for entry in config.get('seed', []):
+        entry['target'] += suffix
+    return config
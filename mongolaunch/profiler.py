@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+'''Turn on the database profiler across a launched cluster, and collect what
+it recorded into a report of the most expensive query shapes.
+
+'''
+
+import datetime
+import json
+import os.path
+import sys
+
+import pymongo
+import pymongo.errors
+
+import mongolaunch.cli
+from mongolaunch.parallel import run_parallel
+from mongolaunch.topology import load_manifest, shard_members
+
+# Databases that are never profiled
+SYSTEM_DATABASES = ('admin', 'local', 'config')
+# Max number of members to talk to at once
+MAX_THREADS = 32
+
+
+def main():
+    mongolaunch.cli.main(["profile"] + sys.argv[1:])
+
+
+def run(args):
+    '''Run the profile command with arguments parsed by mongolaunch.cli'''
+    members = _members(load_manifest(args.manifest))
+    if args.action == "enable":
+        set_profiling(members, args.databases, args.level, args.slowms)
+    elif args.action == "disable":
+        set_profiling(members, args.databases, 0)
+    else:
+        state_file = args.state or "%s.state" % args.output
+        report = harvest_report(members, args.databases, state_file)
+        with open(args.output, "w") as fd:
+            json.dump(report, fd, indent=4)
+        print_report(report, args.top)
+        print("Wrote report to %s" % args.output)
+
+
+def _members(manifest):
+    return [(shard, member_id, manifest['mongoes'][member_id]['uri'])
+            for shard, member_id in shard_members(manifest)]
+
+
+def _client(uri):
+    # A direct connection, so secondaries are profiled and read as well
+    return pymongo.MongoClient(uri, connect=False)
+
+
+def _databases(client, databases):
+    if databases:
+        return databases
+    return [name for name in client.list_database_names()
+            if name not in SYSTEM_DATABASES]
+
+
+def set_profiling(members, databases, level, slowms=None):
+    '''Set the profiling level (and slowms) of <databases> on every member
+    at once. <members> is a list of (shard, member _id, URI).
+
+    '''
+    def set_level(member):
+        shard, member_id, uri = member
+        client = _client(uri)
+        try:
+            options = {} if slowms is None else {"slowms": slowms}
+            names = _databases(client, databases)
+            for name in names:
+                client[name].command("profile", level, **options)
+            print("%s (%s): profiling level %d on %s" % (
+                member_id, shard, level, ", ".join(names) or "no databases"))
+        finally:
+            client.close()
+
+    run_parallel([lambda m=m: set_level(m) for m in members], MAX_THREADS)
+
+
+def normalize(value):
+    '''Replace every value in a query with "?", keeping field names and
+    operators, so that queries which differ only in values look the same
+
+    '''
+    if isinstance(value, dict):
+        return dict((k, normalize(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        # $in: [1, 2, 3] and $in: [4, 5] are the same shape
+        if value and all(isinstance(v, dict) for v in value):
+            return [normalize(v) for v in value]
+        return ["?"]
+    return "?"
+
+
+def query_filter(entry):
+    '''Return the filter of the profiled operation <entry>, which is {} if
+    it has none
+
+    '''
+    command = entry.get("command", {})
+    query = entry.get("query", {})
+    # find commands have a filter, updates and deletes a q,
+    # and count and distinct a query
+    for field in ("filter", "q", "query"):
+        if field in command:
+            return command[field]
+    # 3.2 and 3.4 record the find command itself as the query, and before
+    # 3.2 the query is the filter, or has it under $query
+    for field in ("filter", "$query"):
+        if field in query:
+            return query[field]
+    if "find" in query or "find" in command:
+        return {}
+    return query
+
+
+def query_shape(entry):
+    '''Return a string describing the shape of the profiled operation
+    <entry>
+
+    '''
+    command = entry.get("command", {})
+    query = entry.get("query", {})
+    shape = {"filter": normalize(query_filter(entry))}
+    sort = (command.get("sort") or query.get("sort") or
+            query.get("$orderby"))
+    if sort:
+        shape["sort"] = sort
+    if "pipeline" in command:
+        shape["pipeline"] = normalize(command["pipeline"])
+    return json.dumps(shape, sort_keys=True, default=str)
+
+
+def _harvest_member(member, databases, since):
+    '''Read the profiled operations newer than <since> on one member.
+
+    Returns (shapes, newest timestamp per database)
+
+    '''
+    shard, member_id, uri = member
+    client = _client(uri)
+    shapes = {}
+    newest = {}
+    try:
+        for name in _databases(client, databases):
+            key = "%s/%s" % (member_id, name)
+            query = {}
+            if key in since:
+                query["ts"] = {"$gt": datetime.datetime.utcfromtimestamp(
+                    since[key])}
+            cursor = client[name]['system.profile'].find(
+                query, batch_size=1000).sort("$natural", 1)
+            for entry in cursor:
+                op = entry.get("op", "?")
+                shape_key = (shard, entry.get("ns", name), op,
+                             query_shape(entry))
+                stats = shapes.setdefault(shape_key, {
+                    "shard": shard, "ns": shape_key[1], "op": op,
+                    "shape": shape_key[3], "count": 0, "millis": 0,
+                    "docs_examined": 0, "keys_examined": 0, "returned": 0,
+                    "members": []
+                })
+                stats["count"] += 1
+                stats["millis"] += entry.get("millis", 0)
+                stats["docs_examined"] += entry.get(
+                    "docsExamined", entry.get("nscannedObjects", 0))
+                stats["keys_examined"] += entry.get(
+                    "keysExamined", entry.get("nscanned", 0))
+                stats["returned"] += entry.get("nreturned", 0)
+                if member_id not in stats["members"]:
+                    stats["members"].append(member_id)
+                ts = entry["ts"] - datetime.datetime(1970, 1, 1)
+                newest[key] = (ts.days * 86400 + ts.seconds +
+                               ts.microseconds / 1e6)
+    finally:
+        client.close()
+    return shapes, newest
+
+
+def harvest_report(members, databases, state_file=None):
+    '''Read the profiled operations of every member at once, returning a
+    list of query shapes ranked by total time spent. Only operations newer
+    than the last harvest recorded in <state_file> are read.
+
+    '''
+    since = {}
+    if state_file is not None and os.path.exists(state_file):
+        with open(state_file, "r") as fd:
+            since = json.load(fd)
+
+    results = run_parallel(
+        [lambda m=m: _harvest_member(m, databases, since) for m in members],
+        MAX_THREADS)
+
+    combined = {}
+    for shapes, newest in results:
+        since.update(newest)
+        for key, stats in shapes.items():
+            if key not in combined:
+                combined[key] = stats
+                continue
+            total = combined[key]
+            for field in ("count", "millis", "docs_examined",
+                          "keys_examined", "returned"):
+                total[field] += stats[field]
+            total["members"].extend(m for m in stats["members"]
+                                    if m not in total["members"])
+
+    if state_file is not None:
+        with open(state_file, "w") as fd:
+            json.dump(since, fd)
+
+    report = sorted(combined.values(), key=lambda s: s["millis"],
+                    reverse=True)
+    for stats in report:
+        stats["avg_millis"] = float(stats["millis"]) / stats["count"]
+        stats["examined_per_returned"] = (
+            float(stats["docs_examined"]) / max(stats["returned"], 1))
+    return report
+
+
+def print_report(report, top):
+    print("%-10s %-8s %7s %10s %10s %10s  %s" % (
+        "shard", "op", "count", "millis", "examined", "returned", "ns / shape"))
+    for stats in report[:top]:
+        print("%-10s %-8s %7d %10d %10d %10d  %s %s" % (
+            stats["shard"], stats["op"], stats["count"], stats["millis"],
+            stats["docs_examined"], stats["returned"], stats["ns"],
+            stats["shape"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+'''Progress reports from bootstrap scripts.
+
+The install scripts report when MongoDB is downloaded and when each process
+has started or failed to start. Reports reach the launcher in one of three
+ways:
+
+1. An HTTP request to a listener run by the launcher, when a callback URL
+   that the hosts can reach is given.
+2. The output of the script, for hosts that are set up over SSH.
+3. The EC2 console output of Linux instances, as a last resort. EC2
+   only updates it every few minutes, so reports arrive late this way.
+
+Windows install scripts only report over HTTP.
+
+The launcher keeps trying to connect to each process, and is done as soon
+as it can. Reports only make it give up early, with the log tail, when a
+process failed to start.
+
+Each report in the script output or console output is a line like
+"MONGOLAUNCH <port> <event>", preceded by "MONGOLAUNCH <port> log <line>"
+lines with details on failures.
+
+'''
+
+import re
+import threading
+import time
+import uuid
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse
+
+from mongolaunch import settings
+
+# Events after which there is nothing left to wait for
+FINAL_EVENTS = ('started', 'failed')
+
+_REPORT = re.compile(r"^MONGOLAUNCH (\d+) (\w+)(?: (.*))?$")
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Readiness(object):
+    '''Collects progress reports, by host _id and port
+
+    callback_url    URL where hosts can reach the listener started by
+                    start(), e.g. http://203.0.113.7:8111. If not given,
+                    reports are read from script or console output.
+
+    '''
+
+    def __init__(self, callback_url=None):
+        self.callback_url = callback_url.rstrip("/") if callback_url else None
+        # Keeps other people from making reports
+        self._token = uuid.uuid4().hex
+        # (host _id, port) -> [(event, detail)]
+        self._events = {}
+        self._cond = threading.Condition()
+        self._server = None
+        # host _id -> when its console output was last read
+        self._console_read = {}
+
+    def notify_url(self, host):
+        '''Return the URL the bootstrap script for <host> reports to, or the
+        empty string if there is no listener
+
+        '''
+        if self.callback_url is None:
+            return ""
+        return "%s/%s/%s" % (self.callback_url, self._token, host.id)
+
+    def record(self, host_id, port, event, detail=""):
+        with self._cond:
+            self._events.setdefault((host_id, int(port)), []).append(
+                (event, detail))
+            self._cond.notify_all()
+
+    def parse_output(self, host_id, output):
+        '''Record every report found in <output> from the host <host_id>'''
+        details = {}
+        for line in output.splitlines():
+            match = _REPORT.match(line.strip())
+            if match is None:
+                continue
+            port, event, rest = match.groups()
+            if event == 'log':
+                details.setdefault(port, []).append(rest or "")
+            elif (event, port) not in self._seen(host_id, port):
+                self.record(host_id, port, event,
+                            "\n".join(details.pop(port, [])))
+
+    def _seen(self, host_id, port):
+        # Console output is read over and over, so skip what was recorded
+        with self._cond:
+            return set((event, port) for event, _ in
+                       self._events.get((host_id, int(port)), []))
+
+    def latest(self, host_id, port):
+        '''Return the last (event, detail) reported for <port> on <host_id>,
+        or None
+
+        '''
+        with self._cond:
+            events = self._events.get((host_id, port))
+            return events[-1] if events else None
+
+    def check(self, host, port):
+        '''Return (event, detail) if the process on <port> of <host> was
+        reported to have started or failed, or None, without waiting.
+        Without a listener, the console output of Linux EC2 instances is
+        read for reports, at most every CONSOLE_POLL_INTERVAL seconds.
+
+        '''
+        # Windows install scripts can't write to the console output
+        poll_console = (self._server is None and not host.is_windows() and
+                        hasattr(host, 'console_output'))
+        if poll_console:
+            with self._cond:
+                due = (time.time() - self._console_read.get(host.id, 0) >=
+                       settings.CONSOLE_POLL_INTERVAL)
+                if due:
+                    self._console_read[host.id] = time.time()
+            if due:
+                self.parse_output(host.id, host.console_output())
+        state = self.latest(host.id, port)
+        if state is not None and state[0] in FINAL_EVENTS:
+            return state
+        return None
+
+    def start(self):
+        '''Start listening for reports on the port of callback_url'''
+        if self.callback_url is None or self._server is not None:
+            return
+        readiness = self
+        token = self._token
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                parts = self.path.strip("/").split("/")
+                if len(parts) != 4 or parts[0] != token:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                _, host_id, port, event = parts
+                length = int(self.headers.get("Content-Length") or 0)
+                detail = self.rfile.read(length).decode("utf-8", "replace")
+                readiness.record(host_id, port, event, detail)
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        port = urlparse(self.callback_url).port or 80
+        self._server = _Server(("", port), Handler)
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        print("Listening for bootstrap progress on port %d" % port)
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
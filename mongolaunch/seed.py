@@ -0,0 +1,253 @@
+'''Load data files into freshly launched clusters.
+
+Files are read from local disk in fixed-size batches of raw documents, which
+are handed to a pool of worker processes. Each worker decodes its batch and
+writes it with an unordered insert_many. The number of batches in flight is
+bounded, so memory use does not depend on the size of the input files.
+
+Batches are not split by shard: mongos already sends the documents of one
+unordered insert to all of their shards in parallel, and the workers keep
+several batches in flight at once.
+
+'''
+
+import itertools
+import multiprocessing
+import os.path
+import struct
+import threading
+
+import bson
+from bson import json_util
+import pymongo
+import pymongo.errors
+
+from mongolaunch import errors, settings
+from mongolaunch.journal import Progress
+import mongolaunch.models
+
+FORMATS = ('jsonl', 'bson')
+
+# State for each worker process, set up by _init_worker
+_worker = {}
+
+
+def _file_format(path, fmt=None):
+    '''Return the format of the file at <path>, guessing from its extension
+    if <fmt> is not given
+
+    '''
+    if fmt is None:
+        ext = os.path.splitext(path)[1].lower()
+        fmt = 'bson' if ext == '.bson' else 'jsonl'
+    if fmt not in FORMATS:
+        raise errors.MLConfigurationError(
+            "unknown seed file format %s for %s" % (fmt, path))
+    return fmt
+
+
+def _read_jsonl(fd):
+    for line in fd:
+        if line.strip():
+            yield line
+
+
+def _read_bson(fd):
+    while True:
+        size_data = fd.read(4)
+        if not size_data:
+            return
+        if len(size_data) < 4:
+            raise errors.MLConfigurationError(
+                "truncated BSON document in %s" % fd.name)
+        size = struct.unpack("<i", size_data)[0]
+        rest = fd.read(size - 4)
+        if len(rest) != size - 4:
+            raise errors.MLConfigurationError(
+                "truncated BSON document in %s" % fd.name)
+        yield size_data + rest
+
+
+def read_batches(path, fmt, batch_size):
+    '''Yield lists of at most <batch_size> undecoded documents from the file
+    at <path>
+
+    '''
+    reader = _read_bson if fmt == 'bson' else _read_jsonl
+    with open(path, 'rb') as fd:
+        documents = reader(fd)
+        while True:
+            batch = list(itertools.islice(documents, batch_size))
+            if not batch:
+                return
+            yield batch
+
+
+def router_uris(target):
+    '''Return the MongoDB URIs that seed data should be written through
+    for <target>, which may be a Mongod, ReplicaSet or ShardedCluster
+
+    '''
+    if isinstance(target, mongolaunch.models.ShardedCluster):
+        return ["mongodb://%s:%d" % (target.mongos.host.hostname(),
+                                     target.mongos.port)]
+    if isinstance(target, mongolaunch.models.ReplicaSet):
+        return ["mongodb://%s/?replicaSet=%s" % (
+            ",".join("%s:%d" % (m.host.hostname(), m.port)
+                     for m in target.members),
+            target.name)]
+    return ["mongodb://%s:%d" % (target.host.hostname(), target.port)]
+
+
+def shard_collection(client, namespace, shard_key):
+    '''Shard <namespace> on <shard_key> through the mongos <client> is
+    connected to, unless it is sharded already. Returns the shard key of
+    the collection.
+
+    '''
+    database = namespace.split(".", 1)[0]
+    config = client.config
+    sharded = config.collections.find_one({"_id": namespace,
+                                           "dropped": {"$ne": True}})
+    if sharded is not None:
+        return sharded['key']
+    try:
+        client.admin.command("enableSharding", database)
+    except pymongo.errors.OperationFailure:
+        # already enabled
+        pass
+    client.admin.command("shardCollection", namespace, key=shard_key)
+    return shard_key
+
+
+def _init_worker(uris, namespace):
+    database, collection = namespace.split(".", 1)
+    _worker['collections'] = [
+        pymongo.MongoClient(uri, w=1)[database][collection] for uri in uris
+    ]
+    _worker['next'] = itertools.count()
+
+
+def _decode(fmt, raw):
+    if fmt == 'bson':
+        return bson.BSON(raw).decode()
+    return json_util.loads(raw.decode("utf-8"))
+
+
+def _load_batch(fmt, batch):
+    '''Decode and insert one batch. Runs in a worker process.
+
+    Returns (documents inserted, documents that failed to insert, error)
+
+    '''
+    try:
+        return _insert_batch(fmt, batch) + (None,)
+    except Exception as e:
+        # Exceptions don't always survive the trip back from the worker
+        return 0, len(batch), "%s: %s" % (type(e).__name__, e)
+
+
+def _insert_batch(fmt, batch):
+    documents = [_decode(fmt, raw) for raw in batch]
+    collections = _worker['collections']
+    # Spread the batches over the routers so each one gets parallel load
+    coll = collections[next(_worker['next']) % len(collections)]
+    try:
+        coll.insert_many(documents, ordered=False)
+        inserted = len(documents)
+    except pymongo.errors.BulkWriteError as e:
+        inserted = e.details.get('nInserted', 0)
+    return inserted, len(documents) - inserted
+
+
+def seed(target, namespace, paths, fmt=None, shard_key=None, workers=None,
+         batch_size=settings.SEED_BATCH_SIZE):
+    '''Load the files at <paths> into <namespace> on <target>, a Mongod,
+    ReplicaSet or ShardedCluster model.
+
+    Returns (documents inserted, documents that failed to insert)
+
+    '''
+    if "." not in namespace:
+        raise errors.MLConfigurationError(
+            "seed namespace must look like <database>.<collection>, got %s"
+            % namespace)
+    workers = workers or multiprocessing.cpu_count()
+    uris = router_uris(target)
+
+    if shard_key is not None and \
+            isinstance(target, mongolaunch.models.ShardedCluster):
+        client = pymongo.MongoClient(uris[0])
+        key = shard_collection(client, namespace, shard_key)
+        client.close()
+        print("%s is sharded on %s" % (namespace, json_util.dumps(key)))
+
+    # Bound the number of batches that are read but not yet inserted
+    pending = threading.BoundedSemaphore(
+        workers * settings.SEED_MAX_PENDING_PER_WORKER)
+    totals = [0, 0]
+    failures = []
+
+    def done(result):
+        totals[0] += result[0]
+        totals[1] += result[1]
+        if result[2] is not None:
+            failures.append(result[2])
+        pending.release()
+
+    def batches():
+        for path in paths:
+            file_fmt = _file_format(path, fmt)
+            print("Seeding %s from %s (%s)" % (namespace, path, file_fmt))
+            for batch in read_batches(path, file_fmt, batch_size):
+                yield file_fmt, batch
+
+    pool = multiprocessing.Pool(workers, _init_worker, (uris, namespace))
+    try:
+        for file_fmt, batch in batches():
+            pending.acquire()
+            if failures:
+                break
+            pool.apply_async(_load_batch, (file_fmt, batch), callback=done)
+        pool.close()
+        pool.join()
+    finally:
+        pool.terminate()
+    if failures:
+        raise errors.MongoLaunchError(
+            "seeding %s failed: %s" % (namespace, failures[0]))
+    return tuple(totals)
+
+
+def seed_from_config(config, targets, workers=None, journal=None):
+    '''Run every entry in the "seed" section of <config>. <targets> maps
+    _ids from the configuration to Mongod, ReplicaSet and ShardedCluster
+    models. Entries that <journal> says were loaded already are skipped,
+    and the others are recorded there once loaded.
+
+    '''
+    loaded = set()
+    if journal is not None:
+        loaded = Progress(journal.steps()).seeds
+    for index, entry in enumerate(config.get("seed", [])):
+        if index in loaded:
+            continue
+        target = targets.get(entry['target'])
+        if target is None:
+            raise errors.MLConfigurationError(
+                "no mongo, replica set or cluster %s found to seed!"
+                % entry['target'])
+        inserted, failed = seed(
+            target,
+            entry['namespace'],
+            entry['files'],
+            fmt=entry.get('format'),
+            shard_key=entry.get('shard_key'),
+            workers=workers,
+            batch_size=entry.get('batch_size', settings.SEED_BATCH_SIZE)
+        )
+        print("Seeded %s on %s: %d documents inserted, %d failed" % (
+            entry['namespace'], entry['target'], inserted, failed))
+        if journal is not None:
+            journal.record("seed_loaded", index=index,
+                           namespace=entry['namespace'])
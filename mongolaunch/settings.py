@@ -5,8 +5,42 @@ import os
 
 # Base path for mongolaunch resources (e.g., scripts, keys, etc.)
 ML_PATH = os.path.abspath(os.path.dirname(__file__))
+# Directory for cached EC2 metadata (AMIs, key pairs, security groups)
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".mongolaunch", "cache")
+# Seconds before cached EC2 metadata is looked up again
+CACHE_TTL = 7 * 24 * 60 * 60
+# Journal of the steps completed by launches, used by --resume and terminate
+JOURNAL_PATH = os.path.join(os.path.expanduser("~"), ".mongolaunch",
+                            "journal.jsonl")
+# Max size of EC2 user data, after compression (bytes)
+USER_DATA_LIMIT = 16 * 1024
+# Ways mongo processes can address each other: by public hostname, by
+# private address, or by private address when all hosts share a network
+ADDRESSING_POLICIES = ("auto", "public", "private")
 # Number of tries to connect while waiting for MongoDB to become available
 MAX_MONGO_TRIES = 240
+# Seconds between reads of EC2 console output, when there is no callback
+# listener to hear from install scripts
+CONSOLE_POLL_INTERVAL = 15
+# Seconds a bootstrap script waits for the EBS volume holding a restored
+# dbpath to be attached, before reporting that the process failed
+SEED_DEVICE_TIMEOUT = 600
+# Number of times to check (every 5 seconds) whether an EBS snapshot is done
+MAX_SNAPSHOT_TRIES = 720
+# Directory on hosts other than EC2 instances where mongolaunch snapshot keeps
+# archives of dbpaths it captures
+SNAPSHOT_PATH = "/tmp/mongolaunch-snapshots"
+# Number of documents per insert_many when seeding a cluster with data
+SEED_BATCH_SIZE = 1000
+# Number of seed batches that may be waiting on each worker process. Bounds
+# memory use regardless of the size of the seed files.
+SEED_MAX_PENDING_PER_WORKER = 2
+# Seconds between two rounds of metrics collection in monitor mode
+MONITOR_INTERVAL = 10
+# Max number of threads polling mongo processes in monitor mode
+MONITOR_THREADS = 32
+# Timeout for each metrics request in monitor mode (milliseconds)
+MONITOR_TIMEOUT_MS = 5000
 # AMI to use for the config server (Amazon linux)
 CONFIG_AMI = "ami-a43909e1"
 # Bootstrap script for the config server. Obviously dependent on CONFIG_AMI
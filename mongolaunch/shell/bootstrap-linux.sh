@@ -0,0 +1,55 @@
+#!/bin/sh
+# report progress to mongolaunch: notify <port> <event> [details]
+notify() {
+    report=$(if [ -n "$3" ]; then echo "$3" | sed "s/^/MONGOLAUNCH $1 log /"; fi; echo "MONGOLAUNCH $1 $2")
+    echo "$report"
+    echo "$report" > /dev/console 2> /dev/null
+    if [ -n "{{ notify_url }}" ]; then
+        curl -s -m 10 --data-binary "$3" "{{ notify_url }}/$1/$2" > /dev/null
+    fi
+}
+# download MongoDB <version>, unless it's there already: download <version>
+download() {
+    if [ ! -d /opt/mongolaunch/mongodb-linux-x86_64-$1 ]; then
+        curl -s http://fastdl.mongodb.org/linux/mongodb-linux-x86_64-$1.tgz | tar xz -C /opt/mongolaunch
+    fi
+}
+# tell the processes using <version> whether it downloaded: downloaded <version> <port>...
+downloaded() {
+    version=$1
+    shift
+    for port in "$@"; do
+        if [ -d /opt/mongolaunch/mongodb-linux-x86_64-$version ]; then
+            notify $port downloaded
+        else
+            notify $port failed "could not download MongoDB $version"
+        fi
+    done
+}
+# run a mongo process with --fork and report how it went: start <port> <logpath> <binary> <args>...
+start() {
+    port=$1
+    logpath=$2
+    shift 2
+    # a failed download or seed was reported already
+    [ -x "$1" ] || return
+    [ -e /tmp/mongolaunch-failed-$port ] && return
+    # --fork only returns once the process is ready for connections
+    if "$@" --fork; then
+        notify $port started
+    else
+        notify $port failed "$(tail -n 20 $logpath)"
+    fi
+}
+mkdir -p /opt/mongolaunch
+# each version once, all at the same time
+{{ downloads }}
+wait
+{{ reports }}
+mkdir -p {{ directories }}
+{{ seeds }}
+# mongods (including config servers) at the same time, then mongoses
+{{ mongods }}
+wait
+{{ mongoses }}
+wait
@@ -0,0 +1,29 @@
+#!/bin/sh
+# use a copy of another member's data as {{ dbpath }}
+seed_mnt=/mnt/mongolaunch-seed-{{ port }}
+seed_dev=
+waited=0
+while [ -z "$seed_dev" ] && [ $waited -lt {{ timeout }} ]; do
+    for dev in {{ xvd_device }}1 {{ xvd_device }} {{ device }}1 {{ device }}; do
+        if [ -b $dev ]; then
+            seed_dev=$dev
+            break
+        fi
+    done
+    if [ -z "$seed_dev" ]; then
+        sleep 1
+        waited=$((waited + 1))
+    fi
+done
+if [ -z "$seed_dev" ]; then
+    notify {{ port }} failed "volume {{ device }} with the data for {{ dbpath }} was not attached after {{ timeout }} seconds"
+    # don't let start() run the process on an empty dbpath
+    touch /tmp/mongolaunch-failed-{{ port }}
+else
+    mkdir -p $seed_mnt
+    # the copy may have the same filesystem UUID as the root volume
+    mount $seed_dev $seed_mnt || mount -o nouuid $seed_dev $seed_mnt
+    mkdir -p {{ dbpath }}
+    mount --bind $seed_mnt{{ seed_dbpath }} {{ dbpath }}
+    rm -f {{ dbpath }}/mongod.lock
+fi
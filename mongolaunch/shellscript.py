@@ -1,9 +1,12 @@
 '''Utilities for managing EC2 instances with shell scripts'''
 
+import gzip
+import io
 import os.path
 import re
 
-from mongolaunch.settings import ML_PATH
+from mongolaunch import errors
+from mongolaunch.settings import ML_PATH, USER_DATA_LIMIT
 
 LINUX_INSTALL = "install-linux.sh"
 WINDOWS_INSTALL = "install-windows.ps1"
@@ -21,11 +24,99 @@ def get_script(template_name, context, windows=False):
         template_name,
         "windows.ps1" if windows else "linux.sh"
     )
-    with open(os.path.join(ML_PATH, "shell", template), 'rb') as fd:
+    with open(os.path.join(ML_PATH, "shell", template), "r") as fd:
         return _format_newlines(_make_substitutions(fd.read(), context),
                                 windows=windows)
 
 
+def stage_command(version):
+    '''Return a command that downloads MongoDB <version> to /opt/mongolaunch
+    like the bootstrap script does, unless it's there already, and fails if
+    it isn't there after all
+
+    '''
+    directory = "/opt/mongolaunch/mongodb-linux-x86_64-%s" % version
+    return ("mkdir -p /opt/mongolaunch && ([ -d %s ] || curl -s "
+            "http://fastdl.mongodb.org/linux/mongodb-linux-x86_64-%s.tgz | "
+            "tar xz -C /opt/mongolaunch) && [ -x %s/bin/mongod ]" % (
+                directory, version, directory))
+
+
+def process_command(proc):
+    '''Return the command line that runs the mongod or mongos described by
+    <proc> (see bootstrap_script) from the binaries under /opt/mongolaunch
+
+    '''
+    binary = "/opt/mongolaunch/mongodb-linux-x86_64-%s/bin/%s" % (
+        proc['version'], proc['bin'])
+    if proc['bin'] == 'mongos':
+        return "%s --logpath %s --configdb \"%s\" %s" % (
+            binary, proc['logpath'], proc['configdb'], proc['options'])
+    return "%s --dbpath %s --logpath %s %s" % (
+        binary, proc['dbpath'], proc['logpath'], proc['options'])
+
+
+def bootstrap_script(processes, notify_url="", seeds=()):
+    '''Provide one Linux shell script that installs and starts all of
+    <processes> on a host. Each process is a dict of the values the
+    install-mongodb script takes (bin, version, port, dbpath, logpath,
+    options and configdb). <seeds> are scripts to run once directories exist
+    and before any process starts.
+
+    Each distinct version is downloaded once, with different versions
+    downloaded at the same time. All dbpaths and logpaths are created at
+    once. All mongods are started at the same time, and once they are up,
+    all mongoses.
+
+    '''
+    versions = {}
+    directories = []
+    mongods = []
+    mongoses = []
+    for proc in processes:
+        versions.setdefault(proc['version'], []).append(str(proc['port']))
+        start = "start %s %s %s &" % (proc['port'], proc['logpath'],
+                                      process_command(proc))
+        if proc['bin'] == 'mongos':
+            mongoses.append(start)
+        else:
+            mongods.append(start)
+            directories.append(proc['dbpath'])
+        directories.append(os.path.dirname(proc['logpath']))
+    ordered = sorted(versions)
+    return get_script("bootstrap", {
+        "notify_url": notify_url,
+        "downloads": "\n".join("download %s &" % v for v in ordered),
+        "reports": "\n".join("downloaded %s %s" % (v, " ".join(versions[v]))
+                              for v in ordered),
+        "directories": " ".join(sorted(set(directories))),
+        "seeds": "\n".join(seeds),
+        "mongods": "\n".join(mongods),
+        "mongoses": "\n".join(mongoses)
+    })
+
+
+def user_data(script, windows=False):
+    '''Return <script> as EC2 user data. Linux scripts are gzipped, which
+    cloud-init understands. Raises MLConfigurationError if the result is
+    over the EC2 user data limit.
+
+    '''
+    data = script.encode("utf-8") if not isinstance(script, bytes) else script
+    if not windows:
+        buf = io.BytesIO()
+        # No timestamp, so the same script always gives the same user data
+        with gzip.GzipFile(fileobj=buf, mode="wb", mtime=0) as gz:
+            gz.write(data)
+        data = buf.getvalue()
+    if len(data) > USER_DATA_LIMIT:
+        raise errors.MLConfigurationError(
+            "bootstrap script is %d bytes%s, over the EC2 user data limit of "
+            "%d bytes. Put fewer processes on this instance." % (
+                len(data), "" if windows else " compressed", USER_DATA_LIMIT))
+    return data
+
+
 def script_from_config(context, windows=False):
     '''Provide a shell script that bootstraps the instance described in
     <context> with MongoDB
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+'''Capture the data of every process of a launched topology, so that it can
+be launched again later with the data already loaded.
+
+'''
+
+import json
+import os.path
+import sys
+
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from mongolaunch import settings
+import mongolaunch.cli
+import mongolaunch.models
+from mongolaunch.parallel import run_parallel
+from mongolaunch.topology import attach, load_manifest
+
+
+def main():
+    mongolaunch.cli.main(["snapshot"] + sys.argv[1:])
+
+
+def run(args):
+    '''Run the snapshot command with arguments parsed by mongolaunch.cli'''
+    manifest = load_manifest(args.manifest)
+    topology = attach(manifest, args.access, args.secret)
+    manifest['name'] = args.name
+    manifest['snapshots'] = snapshot(topology, args.name)
+    output = args.output or "%s.json" % args.name
+    with open(output, "w") as fd:
+        json.dump(manifest, fd, indent=4, sort_keys=True)
+    print("Wrote snapshot %s to %s" % (args.name, output))
+
+
+def _set_balancer(topology, stopped):
+    for cluster in topology.clusters.values():
+        client = MongoClient(cluster.mongos.host.hostname(),
+                             port=cluster.mongos.port)
+        try:
+            client.config.settings.update_one(
+                {"_id": "balancer"}, {"$set": {"stopped": stopped}},
+                upsert=True)
+        finally:
+            client.close()
+
+
+def snapshot(topology, name):
+    '''Quiesce <topology> and capture the dbpath of every mongod in it.
+    EC2 instances get an EBS snapshot, and other hosts get a tar archive
+    of each dbpath, kept on the host.
+
+    Returns a JSON-compatible mapping of mongod _id to what was captured
+
+    '''
+    mongods = dict((k, m) for k, m in topology.processes().items()
+                   if not isinstance(m, mongolaunch.models.Mongos))
+
+    # (mongod, client) for every mongod that got locked, whether or not
+    # the others could be
+    locked = []
+
+    def lock(mongo):
+        client = MongoClient(mongo.host.hostname(), port=mongo.port)
+        try:
+            mongolaunch.models.fsync_lock(client)
+        except:
+            client.close()
+            raise
+        locked.append((mongo, client))
+
+    # Keep chunks from moving while shards are captured one by one
+    _set_balancer(topology, True)
+    try:
+        run_parallel([lambda m=m: lock(m) for m in mongods.values()])
+        print("Locked %d mongod processes" % len(locked))
+
+        by_host = {}
+        for mongoid, mongo in mongods.items():
+            by_host.setdefault(mongo.host, []).append((mongoid, mongo))
+
+        def capture(host, mongoes):
+            if host.seed_kind == 'ebs':
+                # One snapshot of the instance covers all of its dbpaths
+                _, snapshot_id, _ = host.snapshot_dbpath(mongoes[0][1], 'ebs')
+                return [(mongoid, {"kind": "ebs",
+                                   "snapshot_id": snapshot_id,
+                                   "dbpath": mongo.config['dbpath']})
+                        for mongoid, mongo in mongoes]
+            captured = []
+            for mongoid, mongo in mongoes:
+                archive = os.path.join(settings.SNAPSHOT_PATH, name,
+                                       "%s.tgz" % mongoid)
+                host.snapshot_dbpath(mongo, 'archive', archive)
+                captured.append((mongoid, {"kind": "archive",
+                                           "host": host.id,
+                                           "path": archive}))
+            return captured
+
+        snapshots = {}
+        for captured in run_parallel([lambda h=h, m=m: capture(h, m)
+                                      for h, m in by_host.items()]):
+            snapshots.update(captured)
+    finally:
+        for mongo, client in locked:
+            try:
+                mongolaunch.models.fsync_unlock(client)
+            except PyMongoError as e:
+                # Keep unlocking the others
+                print("could not unlock %s: %s" % (mongo.config['_id'], e))
+            finally:
+                client.close()
+        _set_balancer(topology, False)
+    return snapshots
+
+
+def restore_point(snapshot, hosts):
+    '''Turn an entry of the "snapshots" section written by main() back into
+    a tuple for Host.restore_dbpath. <hosts> maps host _ids to the Hosts of
+    the new launch.
+
+    '''
+    if snapshot['kind'] == 'ebs':
+        return ('ebs', snapshot['snapshot_id'], snapshot['dbpath'])
+    return ('archive', hosts[snapshot['host']], snapshot['path'])
+
+
+if __name__ == '__main__':
+    main()
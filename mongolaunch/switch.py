@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+'''Switch a launched topology to another version of MongoDB, by restarting
+its processes with other binaries instead of launching it again.
+
+'''
+
+import sys
+import time
+
+import mongolaunch.cli
+from mongolaunch import errors
+import mongolaunch.models
+from mongolaunch.models import run_on_hosts
+from mongolaunch.parallel import run_parallel
+from mongolaunch.shellscript import stage_command
+from mongolaunch.topology import attach, load_manifest
+
+
+def main():
+    mongolaunch.cli.main(["switch-version"] + sys.argv[1:])
+
+
+def run(args):
+    '''Run the switch-version command with arguments parsed by
+    mongolaunch.cli
+
+    '''
+    topology = attach(load_manifest(args.manifest), args.access, args.secret)
+    timings = switch_version(topology, args.version)
+    output = args.output or args.manifest
+    topology.save(output)
+    print("Switched %s to MongoDB %s in %.1f seconds (%.1f staging, %.1f "
+          "restarting)" % (topology.title, args.version, timings['total'],
+                           timings['stage'], timings['restart']))
+    print("Wrote manifest to %s" % output)
+
+
+def stage(hosts, version):
+    '''Download MongoDB <version> on all of <hosts> at once'''
+    print("staging MongoDB %s on %s" % (version, ", ".join(
+        str(h) for h in hosts)))
+    run_on_hosts(hosts, stage_command(version))
+
+
+def switch_version(topology, version):
+    '''Restart every process of <topology> with MongoDB <version>, keeping
+    their dbpaths and options. Binaries are staged on all hosts first. Then
+    clusters, replica sets outside of clusters and the remaining processes
+    are restarted at the same time, each in rolling order: replica set
+    secondaries, then primaries once they have stepped down, then config
+    servers, and mongos last (see ShardedCluster.restart).
+
+    Returns the seconds spent staging, restarting and in total.
+
+    '''
+    windows = [h for h in topology.hosts.values() if h.is_windows()]
+    if windows:
+        raise errors.MLConfigurationError(
+            "can't switch versions on Windows hosts %s" % ", ".join(
+                str(h) for h in windows))
+    started = time.time()
+    stage(topology.hosts.values(), version)
+    staged = time.time()
+
+    tasks = []
+    handled = set()
+    for cluster in topology.clusters.values():
+        tasks.append(lambda cl=cluster: cl.restart(version))
+        handled.update(id(p) for p in cluster.processes())
+    for rs in topology.replicas.values():
+        if not any(id(m) in handled for m in rs.members):
+            tasks.append(lambda rs=rs: rs.restart(version))
+        handled.update(id(m) for m in rs.members)
+    # Whatever is left is restarted in the same order as in a cluster
+    remaining = sorted(
+        (p for p in topology.processes().values() if id(p) not in handled),
+        key=lambda p: isinstance(p, mongolaunch.models.Mongos))
+
+    def restart_remaining():
+        for mongo in remaining:
+            mongo.stop()
+            mongo.restart(version)
+
+    if remaining:
+        tasks.append(restart_remaining)
+    run_parallel(tasks)
+
+    # Relaunching or snapshotting the topology later should use the new
+    # version too
+    for mongo in (topology.config or {}).get('mongo', []):
+        mongo['version'] = version
+        if 'configdb_version' in mongo:
+            mongo['configdb_version'] = version
+    finished = time.time()
+    return {"stage": staged - started, "restart": finished - staged,
+            "total": finished - started}
+
+
+if __name__ == '__main__':
+    main()
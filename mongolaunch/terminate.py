@@ -1,43 +1,75 @@
-import argparse
 import os
-from os.path import join
-import pickle
+import sys
 
 import boto.ec2 as ec2
+from boto.exception import EC2ResponseError
 
-from mongolaunch.settings import ML_PATH
+import mongolaunch.cli
+from mongolaunch.journal import Journal, live_instances
 
 
 def main():
-    parser = argparse.ArgumentParser(description="terminate EC2 instances")
-    parser.add_argument("--region", type=str, dest="region", help="AWS region",
-                        default="us-west-1")
-    parser.add_argument("--secret-key", type=str, dest="secret", help=
-                        "AWS secret key. This can be omitted if AWS_SECRET_KEY "
-                        "is defined in your environment", default=None)
-    parser.add_argument("--access-key", type=str, dest="access", help=
-                        "AWS access key. This can be omitted if AWS_ACCESS_KEY "
-                        "is defined in your environment", default=None)
-
-    args = parser.parse_args()
-    region = args.region
+    mongolaunch.cli.main(["terminate"] + sys.argv[1:])
+
+
+def terminate_instances(conn, instances):
+    '''Terminate the EC2 instances with the ids in <instances>, in as few
+    requests as possible. Instances EC2 doesn't know about anymore were
+    terminated long enough ago to be purged. Returns their ids.
+
+    '''
+    remaining = list(instances)
+    gone = []
+    while remaining:
+        try:
+            conn.terminate_instances(remaining)
+            break
+        except EC2ResponseError as e:
+            if e.error_code != "InvalidInstanceID.NotFound":
+                raise
+            # The error names every id that is not found
+            missing = [i for i in remaining if i in (e.body or "")]
+            if not missing:
+                raise
+            gone.extend(missing)
+            remaining = [i for i in remaining if i not in missing]
+    return gone
+
+
+def run(args):
+    '''Run the terminate command with arguments parsed by mongolaunch.cli'''
     secret = args.secret or os.environ.get("AWS_SECRET_KEY")
     access = args.access or os.environ.get("AWS_ACCESS_KEY")
 
-    instances = None
-    try:
-        with open(join(ML_PATH, ".mongolaunchrc"), "rb") as fd:
-            instances = pickle.load(fd)
-    except IOError:
-        print("Could not find .mongolaunchrc in %s! "
-              "Perhaps you didn't `launch` anything? Exiting..." % ML_PATH)
+    launched = live_instances(args.journal)
+    if not launched:
+        print("No running instances in %s! "
+              "Perhaps you didn't `launch` anything? Exiting..."
+              % args.journal)
         exit(1)
 
-    conn = ec2.connect_to_region(region,
-                                 aws_access_key_id=access,
-                                 aws_secret_access_key=secret)
-    print("terminating instances: %s" % ",".join(instances))
-    conn.terminate_instances(instances)
+    by_region = {}
+    for step in launched:
+        by_region.setdefault(step.get('region') or args.region,
+                             []).append(step)
+    for region, steps in by_region.items():
+        conn = ec2.connect_to_region(region,
+                                     aws_access_key_id=access,
+                                     aws_secret_access_key=secret)
+        instances = [step['instance_id'] for step in steps]
+        print("terminating instances in %s: %s" % (region,
+                                                   ",".join(instances)))
+        gone = terminate_instances(conn, instances)
+        if gone:
+            print("already gone from %s: %s" % (region, ",".join(gone)))
+        for step in steps:
+            Journal(step['launch'], args.journal).record(
+                "instance_terminated", host=step['host'],
+                instance_id=step['instance_id'], region=region)
+    # What was torn down is not to be resumed
+    for launch_id in set(step['launch'] for step in launched):
+        Journal(launch_id, args.journal).record("launch_closed",
+                                                reason="terminated")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,287 @@
+'''Describes everything started by a launch'''
+
+import json
+
+from mongolaunch import errors
+import mongolaunch.models
+
+
+def load_manifest(filename):
+    '''Read a manifest written by Topology.save()'''
+    try:
+        with open(filename, "r") as fd:
+            return json.load(fd)
+    except (IOError, ValueError) as e:
+        raise errors.MLConfigurationError(
+            "could not read manifest %s: %s" % (filename, e))
+
+
+def shard_members(manifest):
+    '''Return (shard name, mongod _id) for every mongod holding data in
+    <manifest>: the members of each shard of each cluster, or every mongod
+    that is not a config server if there are no clusters. Replica set
+    members are named after their set, and standalones after themselves.
+
+    '''
+    replicas = manifest['replicas']
+    if manifest['clusters']:
+        shards = []
+        for cluster in manifest['clusters'].values():
+            shards.extend(cluster['shards'])
+    else:
+        config_servers = set()
+        for mongo in manifest['mongoes'].values():
+            config_servers.update(mongo.get('configdbs', []))
+        members = set()
+        for rs in replicas.values():
+            members.update(rs['members'])
+        shards = list(replicas) + [
+            k for k, m in manifest['mongoes'].items()
+            if m['bin'] == 'mongod' and k not in members and
+            k not in config_servers]
+    result = []
+    for shard in shards:
+        if shard in replicas:
+            result.extend((replicas[shard]['name'], member)
+                          for member in replicas[shard]['members'])
+        else:
+            result.append((shard, shard))
+    return result
+
+
+class Topology(object):
+    '''The result of a launch: the mongo processes, replica sets and sharded
+    clusters that were started, and the hosts they run on.
+
+    mongoes         mapping of _id to Mongod or Mongos
+    replicas        mapping of _id to ReplicaSet
+    clusters        mapping of _id to ShardedCluster
+    config          the configuration document that was launched
+
+    '''
+
+    def __init__(self, title, mongoes, replicas, clusters, duration=None,
+                 config=None):
+        self.title = title
+        self.config = config
+        self.mongoes = mongoes
+        self.replicas = replicas
+        self.clusters = clusters
+        self.duration = duration
+
+    def processes(self):
+        '''Return a mapping of _id to every Mongod and Mongos, including
+        config servers
+
+        '''
+        processes = {}
+        for mongoid, mongo in self.mongoes.items():
+            processes[mongoid] = mongo
+            for cdb in getattr(mongo, 'configdbs', []):
+                processes[cdb.config['_id']] = cdb
+        return processes
+
+    @property
+    def hosts(self):
+        '''Mapping of _id to every Host used by this Topology'''
+        return dict((m.host.id, m.host) for m in self.processes().values())
+
+    def address(self, mongoid):
+        '''Return "hostname:port" for the mongo process <mongoid>'''
+        mongo = self.processes()[mongoid]
+        return "%s:%d" % (mongo.host.hostname(), mongo.port)
+
+    def seed_list(self, rsid):
+        '''Return the comma-separated addresses of the members of the replica
+        set <rsid>
+
+        '''
+        return ",".join("%s:%d" % (m.host.hostname(), m.port)
+                        for m in self.replicas[rsid].members)
+
+    def connection_string(self, id):
+        '''Return a MongoDB URI for the mongo process, replica set or sharded
+        cluster with the given _id
+
+        '''
+        if id in self.clusters:
+            mongos = self.clusters[id].mongos
+            return "mongodb://%s:%d" % (mongos.host.hostname(), mongos.port)
+        if id in self.replicas:
+            return "mongodb://%s/?replicaSet=%s" % (self.seed_list(id),
+                                                    self.replicas[id].name)
+        return "mongodb://%s" % self.address(id)
+
+    def to_manifest(self):
+        '''Return a JSON-compatible description of this Topology'''
+        processes = self.processes()
+        ids = dict((id(m), k) for k, m in processes.items())
+        rs_ids = dict((id(rs), k) for k, rs in self.replicas.items())
+        hosts = dict((host_id, host.to_manifest())
+                     for host_id, host in self.hosts.items())
+        mongoes = {}
+        for mongoid, mongo in processes.items():
+            mongoes[mongoid] = {
+                "bin": mongo.config.get("bin", "mongod"),
+                "version": mongo.config.get("version"),
+                "host": mongo.host.id,
+                "port": mongo.port,
+                "dbpath": mongo.config.get("dbpath"),
+                "logpath": mongo.config.get("logpath"),
+                "options": mongo.config.get("options", ""),
+                "uri": "mongodb://%s" % self.address(mongoid)
+            }
+            if isinstance(mongo, mongolaunch.models.Mongos):
+                mongoes[mongoid]["configdbs"] = [ids[id(c)]
+                                                 for c in mongo.configdbs]
+                mongoes[mongoid]["configdb"] = mongo.config.get("configdb")
+        replicas = {}
+        for rsid, rs in self.replicas.items():
+            replicas[rsid] = {
+                "name": rs.name,
+                "members": [ids[id(m)] for m in rs.members],
+                "seed_list": self.seed_list(rsid),
+                "uri": self.connection_string(rsid)
+            }
+        clusters = {}
+        for clid, cl in self.clusters.items():
+            clusters[clid] = {
+                "mongos": ids[id(cl.mongos)],
+                "shards": [ids.get(id(sh), rs_ids.get(id(sh)))
+                           for sh in cl.shards],
+                "uri": self.connection_string(clid)
+            }
+        return {
+            "title": self.title,
+            "duration": self.duration,
+            "hosts": hosts,
+            "mongoes": mongoes,
+            "replicas": replicas,
+            "clusters": clusters,
+            "config": self.config
+        }
+
+    def save(self, filename):
+        '''Write the manifest of this Topology to <filename>'''
+        with open(filename, "w") as fd:
+            json.dump(self.to_manifest(), fd, indent=4, sort_keys=True)
+
+    def teardown(self):
+        '''Terminate the EC2 instances of this Topology and shut down the
+        mongo processes running on other hosts
+
+        '''
+        journals = {}
+        for host in self.hosts.values():
+            host.terminate()
+            if host.journal is not None:
+                journals[host.journal.launch_id] = host.journal
+        # What was torn down is not to be resumed
+        for journal in journals.values():
+            journal.record("launch_closed", reason="terminated")
+
+    def __str__(self):
+        return "<Topology %s: %s>" % (
+            self.title, ",".join(sorted(self.processes())))
+
+    def __repr__(self):
+        return str(self)
+
+
+def attach(manifest, access=None, secret=None):
+    '''Rebuild the Topology described by <manifest> from hosts and
+    processes that are already running. access and secret are the AWS
+    credentials, and default to AWS_ACCESS_KEY and AWS_SECRET_KEY from the
+    environment.
+
+    '''
+    # Avoid a circular import
+    from mongolaunch.launch import connect
+
+    conns = {}
+    hosts = {}
+    for host_id, entry in manifest['hosts'].items():
+        if entry['type'] == 'instance':
+            region = entry['region']
+            if region not in conns:
+                conns[region] = connect(region, access, secret)
+            host = mongolaunch.models.Instance(
+                id=host_id,
+                conn=conns[region],
+                ami=entry['ami'],
+                keypair=entry['keypair'],
+                group=None,
+                instance_type=entry['instance_type'],
+                user=entry['user'],
+                windows=entry['windows'],
+                zone=entry['zone'],
+                key_file=entry['key_file']
+            )
+            host.attach(entry['instance_id'])
+        else:
+            host = mongolaunch.models.OwnMachine(
+                id=host_id,
+                address=entry['hostname'],
+                user=entry['user'],
+                passwd=entry['password'],
+                windows=entry['windows']
+            )
+            host.attach()
+        hosts[host_id] = host
+
+    def process_config(mongoid, entry):
+        return {
+            "_id": mongoid,
+            "bin": entry['bin'],
+            "version": entry['version'],
+            "dbpath": entry['dbpath'],
+            "logpath": entry['logpath'],
+            "options": entry['options']
+        }
+
+    processes = {}
+    config_servers = set()
+    for mongoid, entry in manifest['mongoes'].items():
+        if entry['bin'] != 'mongos':
+            processes[mongoid] = mongolaunch.models.Mongod(
+                config=process_config(mongoid, entry), port=entry['port'])
+    for mongoid, entry in manifest['mongoes'].items():
+        if entry['bin'] == 'mongos':
+            config = process_config(mongoid, entry)
+            config['configdb'] = entry['configdb']
+            processes[mongoid] = mongolaunch.models.Mongos(
+                config=config,
+                configdbs=[processes[c] for c in entry['configdbs']],
+                port=entry['port'],
+                configdb=entry['configdb'])
+            config_servers.update(entry['configdbs'])
+    for mongoid, mongo in processes.items():
+        hosts[manifest['mongoes'][mongoid]['host']].add_mongo(mongo)
+
+    replicas = {}
+    for rsid, entry in manifest['replicas'].items():
+        rs = mongolaunch.models.ReplicaSet(
+            members=[processes[m] for m in entry['members']],
+            config={"_id": rsid, "name": entry['name'],
+                    "members": entry['members']})
+        rs.attach()
+        replicas[rsid] = rs
+
+    clusters = {}
+    for clid, entry in manifest['clusters'].items():
+        cluster = mongolaunch.models.ShardedCluster(
+            mongos=processes[entry['mongos']],
+            shards=[processes.get(sh) or replicas[sh]
+                    for sh in entry['shards']])
+        cluster.attach()
+        clusters[clid] = cluster
+
+    return Topology(
+        title=manifest['title'],
+        mongoes=dict((k, m) for k, m in processes.items()
+                     if k not in config_servers),
+        replicas=replicas,
+        clusters=clusters,
+        duration=manifest.get('duration'),
+        config=manifest.get('config')
+    )
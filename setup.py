@@ -34,15 +34,17 @@ setup(name='mongolaunch',
       license="http://www.apache.org/licenses/LICENSE-2.0.html",
       platforms=["any"],
       classifiers=filter(None, classifiers.split("\n")),
-      install_requires=['pymongo', 'boto>=2.27.0', 'argparse'],
+      install_requires=['pymongo>=3.6,<4', 'boto>=2.27.0', 'argparse'],
       packages=["mongolaunch"],
       package_data={
           'mongolaunch': ['shell/*'],
       },
       entry_points={
           'console_scripts': [
-              'mongolaunch = mongolaunch.launch:main',
-              'mongoterm = mongolaunch.terminate:main'
+              'mongolaunch = mongolaunch.cli:main',
+              'mongoterm = mongolaunch.terminate:main',
+              'mongoprofile = mongolaunch.profiler:main',
+              'mongosnapshot = mongolaunch.snapshot:main'
           ],
       }
 )
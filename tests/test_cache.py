@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from mongolaunch.cache import MetadataCache
+
+
+class FakeRegion(object):
+    name = "us-test-1"
+
+
+class FakeImage(object):
+    platform = "windows"
+
+
+class FakeConnection(object):
+    '''Counts the EC2 requests MetadataCache makes'''
+
+    region = FakeRegion()
+
+    def __init__(self, error=None):
+        self.requests = 0
+        self.error = error
+
+    def get_image(self, ami):
+        self.requests += 1
+        return FakeImage()
+
+    def get_all_key_pairs(self, keynames):
+        self.requests += 1
+        if self.error is not None:
+            raise self.error
+
+
+def test_entries_expire(tmpdir, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    conn = FakeConnection()
+    cache = MetadataCache(conn, path=str(tmpdir), ttl=60)
+    assert cache.image_is_windows("ami-1")
+    now[0] += 59
+    assert cache.image_is_windows("ami-1")
+    assert conn.requests == 1
+    now[0] += 1
+    assert cache.image_is_windows("ami-1")
+    assert conn.requests == 2
+
+
+def test_entries_are_kept_on_disk(tmpdir):
+    conn = FakeConnection()
+    MetadataCache(conn, path=str(tmpdir), ttl=60).remember(
+        "images", "ami-1", False)
+    assert tmpdir.join("us-test-1.json").check()
+    assert not MetadataCache(conn, path=str(tmpdir),
+                             ttl=60).image_is_windows("ami-1")
+    assert conn.requests == 0
+    # Refreshing ignores what is on disk
+    assert MetadataCache(conn, path=str(tmpdir), ttl=60,
+                         refresh=True).image_is_windows("ami-1")
+    assert conn.requests == 1
+
+
+def _ec2_error(code):
+    exception = pytest.importorskip("boto.exception")
+    error = exception.EC2ResponseError(400, "Bad Request")
+    error.error_code = code
+    return error
+
+
+def test_missing_key_pair_is_not_cached(tmpdir):
+    conn = FakeConnection(_ec2_error("InvalidKeyPair.NotFound"))
+    cache = MetadataCache(conn, path=str(tmpdir), ttl=60)
+    assert not cache.key_pair_exists("k")
+    assert not cache.key_pair_exists("k")
+    assert conn.requests == 2
+
+
+def test_other_ec2_errors_are_raised(tmpdir):
+    error = _ec2_error("RequestLimitExceeded")
+    cache = MetadataCache(FakeConnection(error), path=str(tmpdir), ttl=60)
+    with pytest.raises(type(error)):
+        cache.key_pair_exists("k")
@@ -0,0 +1,38 @@
+import mongolaunch.cli
+
+
+class FakeCommand(object):
+    '''A subcommand module, recording the arguments it is run with'''
+
+    def __init__(self):
+        self.imported = []
+        self.args = None
+
+    def import_module(self, name):
+        self.imported.append(name)
+        return self
+
+    def run(self, args):
+        self.args = args
+
+
+def _main(monkeypatch, argv):
+    command = FakeCommand()
+    monkeypatch.setattr(mongolaunch.cli.importlib, "import_module",
+                        command.import_module)
+    mongolaunch.cli.main(argv)
+    return command
+
+
+def test_arguments_without_a_command_launch(monkeypatch):
+    command = _main(monkeypatch, ["--config", "cluster.json", "--copies", "2"])
+    assert command.imported == ["mongolaunch.launch"]
+    assert command.args.config_filename == "cluster.json"
+    assert command.args.copies == 2
+
+
+def test_commands_are_not_rewritten(monkeypatch):
+    command = _main(monkeypatch, ["terminate", "--journal", "j.jsonl"])
+    assert command.imported == ["mongolaunch.terminate"]
+    command = _main(monkeypatch, ["--dry-run"])
+    assert command.imported == ["mongolaunch.dryrun"]
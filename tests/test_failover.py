@@ -0,0 +1,42 @@
+import time
+
+import pymongo.errors
+
+from mongolaunch.failover import Writer
+
+
+class FakeMember(object):
+    '''A client of one replica set member, as the writer uses it'''
+
+    def __init__(self, state):
+        self.state = state
+        self.probes = 0
+        self.inserts = []
+        self.admin = self
+
+    def command(self, name):
+        self.probes += 1
+        if self.state == "down":
+            raise pymongo.errors.ServerSelectionTimeoutError("down")
+        return {"ismaster": self.state == "primary",
+                "secondary": self.state == "secondary"}
+
+    def __getitem__(self, name):
+        return self
+
+    def insert_one(self, doc):
+        if self.state != "primary":
+            raise pymongo.errors.NotMasterError("not master")
+        self.inserts.append(doc["_id"])
+
+
+def test_writer_skips_members_known_to_be_down():
+    old, new = FakeMember("down"), FakeMember("primary")
+    writer = Writer({"old": old, "new": new}, "trial0", 0.001)
+    writer.down.add("old")
+    writer.start()
+    while not new.inserts:
+        time.sleep(0.01)
+    writer.stop()
+    assert old.probes == 0
+    assert len(writer.acked) == len(new.inserts)
@@ -0,0 +1,107 @@
+import json
+import os.path
+
+from mongolaunch.journal import (
+    Journal,
+    Progress,
+    abandon_launches,
+    live_instances,
+    read_journal,
+    unfinished_launches
+)
+
+
+def _path(tmpdir):
+    return os.path.join(str(tmpdir), "journal", "launches.jsonl")
+
+
+def test_record_creates_directory_and_reads_back(tmpdir):
+    path = _path(tmpdir)
+    journal = Journal("a", path)
+    journal.record("launch_started", config={"mongo": []})
+    journal.record("launch_finished")
+    steps = read_journal(path)
+    assert [s['step'] for s in steps] == ["launch_started", "launch_finished"]
+    assert all(s['launch'] == "a" for s in steps)
+    assert steps[0]['config'] == {"mongo": []}
+
+
+def test_torn_last_line_is_skipped_and_finished(tmpdir):
+    path = _path(tmpdir)
+    journal = Journal("a", path)
+    journal.record("launch_started")
+    # The launcher died halfway through writing a step
+    with open(path, "a") as fd:
+        fd.write('{"step": "instance_launc')
+    assert [s['step'] for s in read_journal(path)] == ["launch_started"]
+
+    journal.record("host_initialized", host="h1")
+    assert [s['step'] for s in read_journal(path)] == [
+        "launch_started", "host_initialized"]
+    with open(path, "r") as fd:
+        lines = fd.read().splitlines()
+    assert json.loads(lines[-1])['host'] == "h1"
+
+
+def test_missing_journal_is_empty(tmpdir):
+    assert read_journal(_path(tmpdir)) == []
+    assert unfinished_launches(_path(tmpdir)) == []
+
+
+def test_steps_of_one_launch(tmpdir):
+    path = _path(tmpdir)
+    Journal("a", path).record("launch_started")
+    Journal("b", path).record("launch_started")
+    Journal("a", path).record("launch_finished")
+    assert [s['step'] for s in Journal("a", path).steps()] == [
+        "launch_started", "launch_finished"]
+
+
+def test_progress_replay():
+    steps = [
+        {"step": "launch_started", "launch": "a", "config": {}},
+        {"step": "instance_launched", "launch": "a", "host": "i1",
+         "instance_id": "i-1"},
+        {"step": "instance_launched", "launch": "a", "host": "i2",
+         "instance_id": "i-2"},
+        {"step": "instance_terminated", "launch": "a", "host": "i2",
+         "instance_id": "i-2"},
+        {"step": "host_initialized", "launch": "a", "host": "h1"},
+        {"step": "process_started", "launch": "a", "process": "m1"},
+        {"step": "set_initiated", "launch": "a", "set": "rs0"},
+        {"step": "shard_added", "launch": "a", "cluster": "cl",
+         "shard": "rs0"},
+        {"step": "seed_loaded", "launch": "a", "index": 0}
+    ]
+    progress = Progress(steps)
+    assert progress.started is steps[0]
+    assert progress.instances == {"i1": "i-1"}
+    assert progress.hosts == set(["h1"])
+    assert progress.sets == set(["rs0"])
+    assert progress.shards == set([("cl", "rs0")])
+    assert progress.seeds == set([0])
+
+
+def test_unfinished_and_abandoned_launches(tmpdir):
+    path = _path(tmpdir)
+    for launch in ("done", "closed", "open"):
+        Journal(launch, path).record("launch_started")
+    Journal("done", path).record("launch_finished")
+    Journal("closed", path).record("launch_closed", reason="terminated")
+    assert [s['launch'] for s in unfinished_launches(path)] == ["open"]
+
+    abandoned = abandon_launches(path)
+    assert [s['launch'] for s in abandoned] == ["open"]
+    assert unfinished_launches(path) == []
+    closed = [s for s in read_journal(path) if s['step'] == 'launch_closed']
+    assert [(s['launch'], s['reason']) for s in closed] == [
+        ("closed", "terminated"), ("open", "abandoned")]
+
+
+def test_live_instances(tmpdir):
+    path = _path(tmpdir)
+    journal = Journal("a", path)
+    journal.record("instance_launched", host="i1", instance_id="i-1")
+    journal.record("instance_launched", host="i2", instance_id="i-2")
+    journal.record("instance_terminated", host="i1", instance_id="i-1")
+    assert [s['instance_id'] for s in live_instances(path)] == ["i-2"]
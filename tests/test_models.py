@@ -0,0 +1,179 @@
+import mongolaunch.models
+from mongolaunch.models import (
+    Host,
+    Mongod,
+    ReplicaSet,
+    addresses,
+    resolve_addressing,
+    with_member
+)
+
+
+class FakeHost(Host):
+
+    def __init__(self, id, network=None, addressing="auto"):
+        Host.__init__(self, id)
+        self._network = network
+        self.addressing = addressing
+
+    def hostname(self):
+        return "%s.public" % self.id
+
+    def private_address(self):
+        return "%s.private" % self.id
+
+    def network(self):
+        return self._network
+
+
+def _mongod(host, port=27017):
+    mongod = Mongod(config={"_id": "%s-%d" % (host.id, port)}, port=port)
+    host.add_mongo(mongod)
+    return mongod
+
+
+def test_resolve_addressing():
+    same = [FakeHost("a", "vpc-1"), FakeHost("b", "vpc-1")]
+    assert resolve_addressing(same, "auto") == "private"
+    assert resolve_addressing(same, "public") == "public"
+    assert resolve_addressing(
+        [FakeHost("a", "vpc-1"), FakeHost("b", "vpc-2")], "auto") == "public"
+    assert resolve_addressing(
+        [FakeHost("a", "vpc-1"), FakeHost("b")], "auto") == "public"
+    assert resolve_addressing([FakeHost("a"), FakeHost("b")],
+                              "private") == "private"
+
+
+def test_addresses_on_one_host_use_localhost():
+    host = FakeHost("a", "vpc-1")
+    mongoes = [_mongod(host, 27017), _mongod(host, 27018)]
+    assert addresses(mongoes) == ["localhost:27017", "localhost:27018"]
+
+
+def test_addresses_include_among():
+    a, b = FakeHost("a"), FakeHost("b")
+    config_server = _mongod(a, 27019)
+    mongos = _mongod(b)
+    assert addresses([config_server]) == ["localhost:27019"]
+    assert addresses([config_server], among=[mongos]) == ["a.public:27019"]
+
+
+def test_addresses_on_one_network_are_private():
+    a, b = FakeHost("a", "vpc-1"), FakeHost("b", "vpc-1")
+    mongoes = [_mongod(a), _mongod(b)]
+    assert addresses(mongoes) == ["a.private:27017", "b.private:27017"]
+    b.addressing = "public"
+    assert addresses(mongoes) == ["a.public:27017", "b.public:27017"]
+
+
+def test_addresses_across_networks_are_public():
+    a, b = FakeHost("a", "vpc-1"), FakeHost("b", "vpc-2")
+    mongoes = [_mongod(a), _mongod(b)]
+    assert addresses(mongoes) == ["a.public:27017", "b.public:27017"]
+
+
+def test_with_member():
+    current = {"_id": "rs0", "version": 3,
+               "members": [{"_id": 0, "host": "a:27017"},
+                           {"_id": 2, "host": "b:27017"}]}
+    config = with_member(current, "c:27017")
+    assert config['version'] == 4
+    assert config['members'][-1] == {"_id": 3, "host": "c:27017"}
+    # The current configuration is left alone
+    assert current['version'] == 3
+    assert len(current['members']) == 2
+
+
+class SeedingHost(FakeHost):
+
+    def __init__(self, id, log):
+        FakeHost.__init__(self, id)
+        self.log = log
+
+    def is_windows(self):
+        return False
+
+    def snapshot_dbpath(self, mongo, kind, archive=None):
+        self.log.append(("snapshot", mongo.config['_id'], kind))
+        return ('archive', self, "/tmp/archive.tgz")
+
+    def restore_dbpath(self, mongo, snapshot):
+        self.log.append(("restore", mongo.config['_id'], snapshot[2]))
+
+
+class FakeMongod(Mongod):
+
+    def __init__(self, id, state, log, port=27017):
+        Mongod.__init__(self, config={"_id": id}, port=port)
+        self.state = state
+        self.log = log
+
+    def is_master(self):
+        return {"ismaster": self.state == "primary",
+                "secondary": self.state == "secondary"}
+
+    def restart(self, version=None):
+        self.log.append(("start", self.config['_id']))
+        self.state = "secondary"
+
+
+class FakeClient(object):
+    '''Stands in for MongoClient, recording the commands it is sent'''
+
+    def __init__(self, log, config):
+        self.log = log
+        self.admin = self
+        self.local = self
+        self.system = self
+        self.replset = self
+        self._config = config
+
+    def __call__(self, host, port=None):
+        self.log.append(("connect", host, port))
+        return self
+
+    def command(self, name, *args, **kwargs):
+        self.log.append(("command", name) + args)
+
+    def find_one(self):
+        return self._config
+
+    def close(self):
+        pass
+
+
+def test_add_member_seeds_then_reconfigures(monkeypatch):
+    log = []
+    a, b = SeedingHost("a", log), SeedingHost("b", log)
+    primary = FakeMongod("rs0_0", "primary", log)
+    secondary = FakeMongod("rs0_1", "secondary", log)
+    a.add_mongo(primary)
+    b.add_mongo(secondary)
+    rs = ReplicaSet(members=[primary, secondary],
+                    config={"_id": "rs0", "name": "rs0"})
+    rs.hosts = ["a.public:27017", "b.public:27017"]
+    current = {"_id": "rs0", "version": 1,
+               "members": [{"_id": 0, "host": "a.public:27017"},
+                           {"_id": 1, "host": "b.public:27017"}]}
+    monkeypatch.setattr(mongolaunch.models, "MongoClient",
+                        FakeClient(log, current))
+
+    new = FakeMongod("rs0_2", None, log, port=27018)
+    b.add_mongo(new)
+    rs.add_member(new)
+
+    steps = [entry for entry in log if entry[0] != "connect"]
+    assert steps == [
+        ("command", "fsync"),
+        ("snapshot", "rs0_0", "archive"),
+        ("command", "fsyncUnlock"),
+        ("restore", "rs0_2", "/tmp/archive.tgz"),
+        ("start", "rs0_2"),
+        ("command", "replSetReconfig", with_member(current,
+                                                   "b.public:27018"))
+    ]
+    # The source was locked and the reconfig sent through the primary
+    connects = [entry[1:] for entry in log if entry[0] == "connect"]
+    assert connects == [("a.public", 27017), ("a.public", 27017)]
+    assert rs.members[-1] is new
+    assert rs.hosts[-1] == "b.public:27018"
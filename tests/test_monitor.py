@@ -0,0 +1,70 @@
+import datetime
+
+from mongolaunch.monitor import _prometheus_text, _repl_metrics, host_load
+
+
+def _sample(host, ts, ops, id="m0", up=1, connections=3):
+    sample = {"ts": ts, "id": id, "kind": "mongod", "host": host, "up": up}
+    if up:
+        sample["status"] = {
+            "uptime": 100, "connections": connections, "resident_mb": 64,
+            "queued": 0, "opcounters": {"insert": ops, "query": 0}
+        }
+    return sample
+
+
+def test_host_load_rates():
+    previous = {}
+    first = host_load([_sample("a", 10.0, 100),
+                       _sample("a", 10.0, 50, id="m1")], previous)
+    assert len(first) == 1
+    assert first[0]["processes"] == 2
+    assert first[0]["up"] == 2
+    assert first[0]["connections"] == 6
+    # No rate until there is a previous sample to compare with
+    assert "ops_per_sec" not in first[0]
+    assert previous == {"a": (150, 10.0)}
+
+    second = host_load([_sample("a", 12.0, 300),
+                        _sample("a", 12.0, 50, id="m1", up=0)], previous)
+    assert second[0]["processes"] == 2
+    assert second[0]["up"] == 1
+    assert second[0]["ops_per_sec"] == 75.0
+
+    # Counters that go back, e.g. after a restart, don't make a negative
+    # rate
+    third = host_load([_sample("a", 13.0, 10)], previous)
+    assert third[0]["ops_per_sec"] == 0
+
+
+def test_repl_lag():
+    now = datetime.datetime(2020, 1, 1)
+    status = {"set": "rs0", "myState": 2, "members": [
+        {"state": 1, "optimeDate": now},
+        {"state": 2, "self": True,
+         "optimeDate": now - datetime.timedelta(seconds=2, milliseconds=500)}
+    ]}
+    assert _repl_metrics(status) == {"set": "rs0", "state": 2,
+                                     "lag_secs": 2.5}
+
+
+def test_prometheus_text():
+    up = _sample("a", 10.0, 7)
+    up["repl"] = {"set": "rs0", "state": 1}
+    down = _sample("b", 10.0, 0, id="m1", up=0)
+    hosts = host_load([up, down], {})
+    text = _prometheus_text([up, down], hosts)
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert 'mongolaunch_up{host="a",id="m0",kind="mongod"} 1' in lines
+    assert 'mongolaunch_up{host="b",id="m1",kind="mongod"} 0' in lines
+    assert 'mongolaunch_opcounters_total' \
+        '{host="a",id="m0",kind="mongod",op="insert"} 7' in lines
+    assert 'mongolaunch_repl_state' \
+        '{host="a",id="m0",kind="mongod",set="rs0"} 1' in lines
+    assert 'mongolaunch_host_processes{host="b"} 1' in lines
+    # Nothing but up is reported for a process that is down, and metrics
+    # without a value are left out
+    assert not [l for l in lines if 'id="m1"' in l and "_up{" not in l]
+    assert not [l for l in lines if "repl_lag_seconds" in l]
+    assert not [l for l in lines if "ops_per_sec" in l]
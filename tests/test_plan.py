@@ -0,0 +1,116 @@
+import pytest
+
+from mongolaunch import errors
+from mongolaunch.plan import (
+    assignments,
+    check,
+    configdb_hosts,
+    copy_config,
+    ports_needed
+)
+
+
+def _config():
+    return {
+        "configuration_title": "example",
+        "instances": [{"_id": "shard0_inst"}, {"_id": "mongos_inst"}],
+        "hosts": [{"_id": "box"}],
+        "mongo": [
+            {"_id": "rs0_0", "bin": "mongod", "instance": "shard0_inst"},
+            {"_id": "rs0_1", "bin": "mongod", "host": "box", "port": 27018,
+             "dbpath": "/data/rs0_1", "logpath": "/var/log/rs0_1.log"},
+            {"_id": "mongos", "bin": "mongos", "instance": "mongos_inst",
+             "single_configdb": False, "configdb_version": "3.6.23"}
+        ],
+        "replicas": [{"_id": "rs0", "members": ["rs0_0", "rs0_1"]}],
+        "clusters": [{"_id": "cl", "mongos": "mongos", "shards": ["rs0"]}],
+        "seed": [{"target": "cl"}]
+    }
+
+
+def test_ports_needed():
+    assert ports_needed(_config()) == 6
+
+
+def test_copy_config_renames_everything():
+    original = _config()
+    copy = copy_config(original, 2, 100)
+    assert copy['configuration_title'] == "example (copy 2)"
+    assert [i['_id'] for i in copy['instances']] == [
+        "shard0_inst-c2", "mongos_inst-c2"]
+    assert [m['_id'] for m in copy['mongo']] == [
+        "rs0_0-c2", "rs0_1-c2", "mongos-c2"]
+    assert copy['mongo'][0]['instance'] == "shard0_inst-c2"
+    assert copy['replicas'] == [{"_id": "rs0-c2",
+                                 "members": ["rs0_0-c2", "rs0_1-c2"]}]
+    assert copy['clusters'] == [{"_id": "cl-c2", "mongos": "mongos-c2",
+                                 "shards": ["rs0-c2"]}]
+    assert copy['seed'] == [{"target": "cl-c2"}]
+    # The original is left alone
+    assert original == _config()
+
+
+def test_copy_config_moves_processes_on_shared_hosts():
+    copy = copy_config(_config(), 1, 100)
+    assert copy['hosts'] == [{"_id": "box"}]
+    on_host = copy['mongo'][1]
+    assert on_host['host'] == "box"
+    assert on_host['port'] == 27118
+    assert on_host['dbpath'] == "/data/rs0_1-c1"
+    assert on_host['logpath'] == "/var/log/rs0_1-c1.log"
+
+
+def test_copies_get_their_own_config_server_instances():
+    # Config server instances are named after each mongos
+    names = set()
+    for index in range(3):
+        copy = copy_config(_config(), index, 100)
+        mongos = [m for m in copy['mongo'] if m['bin'] == 'mongos'][0]
+        names.update("%s_config%d_inst" % (mongos['_id'], i)
+                     for i in range(3))
+    assert len(names) == 9
+
+
+def test_check():
+    check(_config(), key_name="key")
+    with pytest.raises(errors.MLConfigurationError):
+        check(_config())
+    config = _config()
+    config['mongo'][0]['instance'] = "missing_inst"
+    with pytest.raises(errors.MLConfigurationError):
+        check(config, key_name="key")
+    config = _config()
+    config['replicas'][0]['members'].append("rs0_2")
+    with pytest.raises(errors.MLConfigurationError):
+        check(config, key_name="key")
+    config = _config()
+    config['seed'][0]['target'] = "missing"
+    with pytest.raises(errors.MLConfigurationError):
+        check(config, key_name="key")
+
+
+def test_check_rejects_seed_from():
+    config = _config()
+    config['mongo'][1]['seed_from'] = "rs0_0"
+    with pytest.raises(errors.MLConfigurationError):
+        check(config, key_name="key")
+
+
+def test_assignments():
+    assert assignments(_config(), 27017) == [
+        ("rs0_0", "mongod", "shard0_inst", 27017),
+        # A port is taken even when the configuration gives one
+        ("rs0_1", "mongod", "box", 27018),
+        ("config27019", "mongod", "mongos_config0_inst", 27019),
+        ("config27020", "mongod", "mongos_config1_inst", 27020),
+        ("config27021", "mongod", "mongos_config2_inst", 27021),
+        ("mongos", "mongos", "mongos_inst", 27022)
+    ]
+
+
+def test_config_servers_go_with_mongos_when_shards_do():
+    config = _config()
+    for mongo in config['mongo']:
+        mongo.pop('host', None)
+        mongo['instance'] = "mongos_inst"
+    assert configdb_hosts(config) == {"mongos": ["mongos_inst"] * 3}
@@ -0,0 +1,57 @@
+import json
+
+from mongolaunch.profiler import normalize, query_shape
+
+
+def _shape(entry):
+    return json.loads(query_shape(entry))
+
+
+def test_normalize():
+    assert normalize({"a": 1, "b": {"$in": [1, 2, 3]}}) == \
+        {"a": "?", "b": {"$in": ["?"]}}
+    assert normalize({"$or": [{"a": 1}, {"b": "x"}]}) == \
+        {"$or": [{"a": "?"}, {"b": "?"}]}
+    assert normalize([]) == ["?"]
+
+
+def test_legacy_query_shapes():
+    assert _shape({"op": "query", "query": {"a": 5}}) == \
+        {"filter": {"a": "?"}}
+    assert _shape({"op": "query",
+                   "query": {"$query": {"a": 5}, "$orderby": {"a": 1}}}) == \
+        {"filter": {"a": "?"}, "sort": {"a": 1}}
+    assert _shape({"op": "query", "query": {"$query": {}}}) == {"filter": {}}
+
+
+def test_find_command_shapes():
+    # 3.2 and 3.4 record the find command as the query
+    assert _shape({"op": "query",
+                   "query": {"find": "docs", "filter": {"a": 5},
+                             "sort": {"b": -1}}}) == \
+        {"filter": {"a": "?"}, "sort": {"b": -1}}
+    assert _shape({"op": "query", "query": {"find": "docs"}}) == \
+        {"filter": {}}
+    assert _shape({"op": "query", "command": {"find": "docs"}}) == \
+        {"filter": {}}
+    assert _shape({"op": "query",
+                   "command": {"find": "docs", "filter": {}}}) == \
+        {"filter": {}}
+
+
+def test_update_and_count_shapes():
+    assert _shape({"op": "update",
+                   "command": {"q": {"a": 5}, "u": {"$set": {"b": 1}}}}) == \
+        {"filter": {"a": "?"}}
+    assert _shape({"op": "command",
+                   "command": {"count": "docs", "query": {"a": 5}}}) == \
+        {"filter": {"a": "?"}}
+
+
+def test_aggregate_shape():
+    entry = {"op": "command",
+             "command": {"aggregate": "docs", "pipeline": [
+                 {"$match": {"a": 5}},
+                 {"$group": {"_id": "$b", "n": {"$sum": 1}}}]}}
+    assert _shape(entry) == {"filter": {}, "pipeline": [
+        {"$match": {"a": "?"}}, {"$group": {"_id": "?", "n": {"$sum": "?"}}}]}
@@ -0,0 +1,45 @@
+from mongolaunch.readiness import Readiness
+
+
+class ConsoleHost(object):
+    '''An EC2 instance as Readiness sees it'''
+
+    def __init__(self, id, output="", windows=False):
+        self.id = id
+        self.output = output
+        self.windows = windows
+        self.reads = 0
+
+    def is_windows(self):
+        return self.windows
+
+    def console_output(self):
+        self.reads += 1
+        return self.output
+
+
+def test_check_does_not_wait():
+    readiness = Readiness()
+    host = ConsoleHost("inst")
+    assert readiness.check(host, 27017) is None
+    readiness.record("inst", 27017, "downloaded")
+    assert readiness.check(host, 27017) is None
+    readiness.record("inst", 27017, "started")
+    assert readiness.check(host, 27017) == ("started", "")
+
+
+def test_check_reads_console_at_most_once_per_interval():
+    readiness = Readiness()
+    host = ConsoleHost("inst", "MONGOLAUNCH 27017 log no space left\n"
+                               "MONGOLAUNCH 27017 failed\n")
+    assert readiness.check(host, 27017) == ("failed", "no space left")
+    assert readiness.check(host, 27018) is None
+    assert host.reads == 1
+
+
+def test_check_ignores_windows_console():
+    readiness = Readiness()
+    host = ConsoleHost("win", "MONGOLAUNCH 27017 failed\n", windows=True)
+    assert readiness.check(host, 27017) is None
+    assert host.reads == 0
+
@@ -0,0 +1,86 @@
+import bson
+import pymongo.errors
+import pytest
+
+from mongolaunch import errors, seed
+
+
+def test_read_batches_jsonl(tmpdir):
+    path = tmpdir.join("docs.jsonl")
+    path.write("".join('{"_id": %d}\n' % i for i in range(5)) + "\n")
+    batches = list(seed.read_batches(str(path), "jsonl", 2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert seed._decode("jsonl", batches[2][0]) == {"_id": 4}
+
+
+def test_read_batches_bson(tmpdir):
+    docs = [{"_id": i, "name": "doc%d" % i} for i in range(3)]
+    path = tmpdir.join("docs.bson")
+    path.write_binary(b"".join(bson.BSON.encode(doc) for doc in docs))
+    batches = list(seed.read_batches(str(path), "bson", 2))
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert [seed._decode("bson", raw)
+            for batch in batches for raw in batch] == docs
+
+
+def test_read_batches_truncated_bson(tmpdir):
+    path = tmpdir.join("docs.bson")
+    path.write_binary(bson.BSON.encode({"_id": 1})[:-2])
+    with pytest.raises(errors.MLConfigurationError):
+        list(seed.read_batches(str(path), "bson", 10))
+
+
+class FakeMongos(object):
+    '''Just enough of a mongos client for shard_collection'''
+
+    def __init__(self, sharded=None, enabled=False):
+        self.sharded = sharded
+        self.enabled = enabled
+        self.commands = []
+        self.config = self
+        self.collections = self
+        self.admin = self
+
+    def find_one(self, query):
+        return self.sharded
+
+    def command(self, name, *args, **kwargs):
+        self.commands.append(name)
+        if name == "enableSharding" and self.enabled:
+            raise pymongo.errors.OperationFailure("already enabled")
+
+
+def test_shard_collection():
+    client = FakeMongos(enabled=True)
+    assert seed.shard_collection(client, "test.docs", {"a": 1}) == {"a": 1}
+    assert client.commands == ["enableSharding", "shardCollection"]
+
+
+def test_shard_collection_sharded_already():
+    client = FakeMongos(sharded={"_id": "test.docs", "key": {"b": 1}})
+    assert seed.shard_collection(client, "test.docs", {"a": 1}) == {"b": 1}
+    assert client.commands == []
+
+
+class FakeCollection(object):
+
+    def __init__(self, duplicates=0):
+        self.duplicates = duplicates
+        self.inserts = []
+
+    def insert_many(self, documents, ordered=True):
+        assert not ordered
+        self.inserts.append(len(documents))
+        if self.duplicates:
+            raise pymongo.errors.BulkWriteError(
+                {"nInserted": len(documents) - self.duplicates})
+
+
+def test_insert_batch_sends_whole_batches(monkeypatch):
+    collections = [FakeCollection(), FakeCollection(duplicates=1)]
+    monkeypatch.setitem(seed._worker, "collections", collections)
+    monkeypatch.setitem(seed._worker, "next", iter(range(10)))
+    batch = [('{"_id": %d}' % i).encode("utf-8") for i in range(4)]
+    assert seed._insert_batch("jsonl", batch) == (4, 0)
+    assert seed._insert_batch("jsonl", batch) == (3, 1)
+    assert [c.inserts for c in collections] == [[4], [4]]
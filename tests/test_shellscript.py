@@ -0,0 +1,92 @@
+import gzip
+import io
+import os.path
+import random
+import string
+import subprocess
+
+import pytest
+
+from mongolaunch import errors
+from mongolaunch.settings import USER_DATA_LIMIT
+from mongolaunch.shellscript import bootstrap_script, get_script, user_data
+
+
+def _process(port, bin="mongod", version="3.6.23"):
+    proc = {"bin": bin, "version": version, "port": port,
+            "dbpath": "/data/db-%d" % port,
+            "logpath": "/var/log/mongo-%d.log" % port,
+            "options": "--port %d" % port}
+    if bin == "mongos":
+        proc["configdb"] = "localhost:27020"
+    return proc
+
+
+def test_bootstrap_script():
+    script = bootstrap_script(
+        [_process(27017), _process(27018, version="4.0.28"),
+         _process(27019, bin="mongos")],
+        notify_url="http://example.com/notify")
+    assert "http://example.com/notify" in script
+    # Each version is downloaded once
+    assert script.count("download 3.6.23 &") == 1
+    assert script.count("download 4.0.28 &") == 1
+    assert "--configdb \"localhost:27020\"" in script
+    # mongos starts after all mongods
+    assert script.index("start 27019") > script.index("start 27018")
+    assert "{{" not in script
+
+
+def _roundtrip(data):
+    with gzip.GzipFile(fileobj=io.BytesIO(data), mode="rb") as gz:
+        return gz.read().decode("utf-8")
+
+
+def test_user_data_is_gzipped_and_stable():
+    script = bootstrap_script([_process(27017)])
+    data = user_data(script)
+    assert _roundtrip(data) == script
+    assert user_data(script) == data
+
+
+def test_user_data_windows_is_not_compressed():
+    assert user_data(u"Write-Host hi", windows=True) == b"Write-Host hi"
+
+
+def test_user_data_over_limit():
+    # Random text doesn't compress below the limit
+    rand = random.Random(0)
+    script = "".join(rand.choice(string.ascii_letters)
+                     for _ in range(USER_DATA_LIMIT * 2))
+    with pytest.raises(errors.MLConfigurationError):
+        user_data(script)
+    with pytest.raises(errors.MLConfigurationError):
+        user_data("x" * (USER_DATA_LIMIT + 1), windows=True)
+
+
+def test_many_processes_fit_compressed():
+    processes = [_process(27017 + i) for i in range(100)]
+    script = bootstrap_script(processes)
+    assert len(script) > USER_DATA_LIMIT
+    assert len(user_data(script)) <= USER_DATA_LIMIT
+
+
+def test_seed_script_gives_up_on_missing_volume():
+    script = get_script("seed-dbpath", {
+        "device": "/dev/sdz-missing",
+        "xvd_device": "/dev/xvdz-missing",
+        "seed_dbpath": "/data/db",
+        "dbpath": "/data/db-seeded",
+        "port": "65000",
+        "timeout": "1"
+    })
+    marker = "/tmp/mongolaunch-failed-65000"
+    stub = 'notify() { echo "notify $1 $2 $3"; }\n'
+    try:
+        output = subprocess.check_output(["sh", "-c", stub + script])
+        assert os.path.exists(marker)
+    finally:
+        if os.path.exists(marker):
+            os.remove(marker)
+    assert output.decode("utf-8").startswith(
+        "notify 65000 failed volume /dev/sdz-missing")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+'''Check that the mongolaunch command starts quickly.
+
+Times `mongolaunch --help` and `mongolaunch launch --dry-run` in fresh
+interpreters, and fails if the median wall time of either is over budget,
+or if either imports boto, pymongo or fabric.
+
+        python tools/startup_check.py [--budget-ms 300] [--runs 10]
+
+'''
+
+import argparse
+import os.path
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Libraries that only the commands talking to hosts should import
+BACKENDS = ("boto", "pymongo", "fabric")
+
+# Runs the CLI, then reports which backends were imported
+_PROBE = '''
+import sys
+import mongolaunch.cli
+try:
+    mongolaunch.cli.main(sys.argv[1:])
+except SystemExit:
+    pass
+sys.stderr.write("IMPORTED %s\\n" % ",".join(
+    m for m in {backends!r} if m in sys.modules))
+'''.format(backends=BACKENDS)
+
+COMMANDS = {
+    "--help": ["--help"],
+    "--dry-run": ["launch", "--dry-run", "--key-name", "startup-check",
+                  "--config", os.path.join(ROOT, "examples",
+                                           "repl_sharded_windows.json")]
+}
+
+
+def time_command(argv, runs):
+    '''Return the wall times of <runs> runs of the CLI with <argv>, and the
+    backends imported by the last one
+
+    '''
+    times = []
+    imported = []
+    for _ in range(runs):
+        started = time.time()
+        proc = subprocess.Popen([sys.executable, "-c", _PROBE] + argv,
+                                cwd=ROOT, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        _, err = proc.communicate()
+        times.append(time.time() - started)
+        for line in err.decode("utf-8", "replace").splitlines():
+            if line.startswith("IMPORTED "):
+                imported = [m for m in line[len("IMPORTED "):].split(",") if m]
+    return times, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check mongolaunch startup time")
+    parser.add_argument("--budget-ms", type=float, dest="budget_ms",
+                        default=300, help="max median wall time per command")
+    parser.add_argument("--runs", type=int, dest="runs", default=10,
+                        help="number of runs per command")
+    args = parser.parse_args()
+
+    failed = False
+    for name, argv in sorted(COMMANDS.items()):
+        times, imported = time_command(argv, args.runs)
+        median = sorted(times)[len(times) // 2] * 1000
+        status = "ok"
+        if median > args.budget_ms:
+            status = "SLOW"
+            failed = True
+        if imported:
+            status = "IMPORTS %s" % ",".join(imported)
+            failed = True
+        print("mongolaunch %-10s median %7.1f ms  max %7.1f ms  %s" % (
+            name, median, max(times) * 1000, status))
+    exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()